@@ -1,8 +1,12 @@
 from .classifier import *
+from .ensemble import *
 from .instruments import *
 from .light_curve import *
 from .parsnip import *
+from .pipeline import *
 from .plotting import *
 from .settings import *
 from .sncosmo import *
+from .sweep import *
+from .telemetry import *
 from .utils import *
@@ -0,0 +1,298 @@
+import numpy as np
+
+import torch
+from torch import nn
+
+from .parsnip import load_model
+
+# Predictions that have the same physical meaning for every model in an ensemble. We
+# combine these across the models. The latent variables (s1, s2, ...) of
+# independently trained models are not aligned with each other, so those are only
+# reported for each model.
+_ENSEMBLE_AGGREGATE_KEYS = [
+    'reference_time', 'color', 'amplitude', 'predicted_redshift', 'luminosity'
+]
+
+# Predictions that only depend on the data and not on the model.
+_ENSEMBLE_DATA_KEYS = ['total_s2n', 'count', 'count_s2n_3', 'count_s2n_5']
+
+
+class _EnsembleMember(nn.Module):
+    """Wrapper around a ParSNIP model that evaluates its MAP prediction for a batch of
+    data
+
+    This is used with `torch.func.functional_call` to evaluate all of the models in an
+    ensemble at the same time.
+    """
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_data, compare_data, redshift, band_indices):
+        model = self.model
+
+        encoding_mu, encoding_logvar = model.encode(input_data)
+        predicted_redshifts, ref_times, color, encoding = \
+            model._parse_encoding(encoding_mu)
+
+        if model.settings['predict_redshift']:
+            use_redshifts = predicted_redshifts
+        else:
+            use_redshifts = redshift
+
+        time = compare_data[:, 0]
+        obs_flux = compare_data[:, 1]
+        obs_weight = compare_data[:, 3]
+
+        _, model_flux = model.decode(
+            encoding, ref_times, color, time, use_redshifts, band_indices,
+            return_spectra=False
+        )
+
+        amplitude_mu, amplitude_logvar = model._compute_amplitude(
+            obs_weight, model_flux, obs_flux
+        )
+        model_flux = model_flux * amplitude_mu[:, None]
+
+        return encoding_mu, encoding_logvar, amplitude_mu, amplitude_logvar, model_flux
+
+
+class ParsnipEnsemble():
+    """Ensemble of ParSNIP models that are evaluated together
+
+    All of the models must have the same settings (and hence the same bands and
+    architecture). The weights of the models are stacked, and each batch of light
+    curves is collated once and then run through all of the models at the same time
+    using `torch.func.vmap`. For models that predict the redshift,
+    settings['band_weight_cache_size'] must be 0 and
+    settings['decode_sparse_photometry'] must be False.
+
+    Parameters
+    ----------
+    models : List[`~ParsnipModel`]
+        Models in the ensemble
+
+    Raises
+    ------
+    ValueError
+        If the models have different settings or use settings that aren't supported
+        in an ensemble.
+    """
+    def __init__(self, models):
+        if len(models) == 0:
+            raise ValueError('An ensemble needs at least one model.')
+
+        self.models = models
+        self.model = models[0]
+
+        for model in models[1:]:
+            if not self._same_settings(self.model.settings, model.settings):
+                raise ValueError(
+                    f"Model '{model.path}' has different settings than model "
+                    f"'{self.model.path}'. All of the models in an ensemble must have "
+                    "the same settings."
+                )
+
+        # Models that predict the redshift decode at a different redshift for each
+        # model. These redshifts are batched by vmap, so they can't be converted to
+        # Python values to look up the band weight cache or to choose the bins for
+        # sparse decoding.
+        settings = self.model.settings
+        if settings['predict_redshift'] and (settings['band_weight_cache_size'] > 0
+                                             or settings['decode_sparse_photometry']):
+            raise ValueError(
+                "Ensembles of models that predict the redshift don't support "
+                "band_weight_cache_size > 0 or decode_sparse_photometry. Disable these "
+                "settings in the models before building the ensemble."
+            )
+
+        for model in models:
+            model.to(self.model.device)
+            model.eval()
+
+        self._members = [_EnsembleMember(model) for model in models]
+        self._params, self._buffers = torch.func.stack_module_state(self._members)
+
+    @staticmethod
+    def _same_settings(settings_1, settings_2):
+        """Check whether two settings dictionaries are the same"""
+        if settings_1.keys() != settings_2.keys():
+            return False
+
+        for key in settings_1:
+            if not np.array_equal(settings_1[key], settings_2[key]):
+                return False
+
+        return True
+
+    def _evaluate(self, data):
+        """Evaluate all of the models in the ensemble on a batch of data
+
+        Parameters
+        ----------
+        data : dict
+            Data dictionary returned by `~ParsnipModel._get_data`
+
+        Returns
+        -------
+        List[dict]
+            Outputs of each model in the same format as `~ParsnipModel.forward`.
+        """
+        base = self._members[0]
+
+        def evaluate_member(params, buffers, input_data, compare_data, redshift,
+                            band_indices):
+            return torch.func.functional_call(
+                base, (params, buffers),
+                (input_data, compare_data, redshift, band_indices)
+            )
+
+        with torch.no_grad():
+            outputs = torch.func.vmap(
+                evaluate_member, in_dims=(0, 0, None, None, None, None)
+            )(self._params, self._buffers, data['input_data'], data['compare_data'],
+              data['redshift'], data['band_indices'])
+
+        compare_data = data['compare_data']
+
+        results = []
+        for member_idx in range(len(self.models)):
+            (encoding_mu, encoding_logvar, amplitude_mu, amplitude_logvar,
+             model_flux) = [i[member_idx] for i in outputs]
+
+            results.append({
+                'encoding_mu': encoding_mu,
+                'encoding_logvar': encoding_logvar,
+                'amplitude_mu': amplitude_mu,
+                'amplitude_logvar': amplitude_logvar,
+                'time': compare_data[:, 0],
+                'obs_flux': compare_data[:, 1],
+                'obs_fluxerr': compare_data[:, 2],
+                'model_flux': model_flux,
+            })
+
+        return results
+
+    def predict_dataset(self, dataset, augment=False):
+        """Generate predictions for a dataset with every model in the ensemble
+
+        The output table contains the metadata for the dataset along with the
+        following columns:
+
+        - {key}_members: The prediction from each model, with shape (number of light
+          curves, number of models), for each of the keys returned by
+          `~ParsnipModel.predict_dataset`. This includes the uncertainties, e.g.
+          'color_error_members'.
+        - reference_time, color, amplitude, luminosity and predicted_redshift (if
+          the models predict redshifts): The mean of the predictions from the different
+          models.
+        - {key}_error for each of the combined predictions: The uncertainty of the
+          combined prediction. This includes both the uncertainty reported by each
+          model and the scatter between the models.
+        - total_s2n, count, count_s2n_3 and count_s2n_5: These only depend on the data
+          and are the same for every model.
+
+        The latent variables of independently trained models are not aligned, so they
+        are only available for each model separately.
+
+        Parameters
+        ----------
+        dataset : `~lcdata.Dataset`
+            Dataset to generate predictions for.
+        augment : bool, optional
+            Whether to perform augmentation, False by default. The same augmentation
+            is used for every model.
+
+        Returns
+        -------
+        predictions : `~astropy.table.Table`
+            astropy Table with one row for each light curve and columns with each of the
+            predicted values.
+        """
+        model = self.model
+        num_members = len(self.models)
+
+        dataset = model.preprocess(dataset, verbose=len(dataset) > 100)
+        loader = model.get_data_loader(dataset, augment=augment)
+
+        member_predictions = [[] for i in range(num_members)]
+
+        for batch_lcs in loader:
+            data = model._get_data(batch_lcs)
+            results = self._evaluate(data)
+
+            for member_idx, result in enumerate(results):
+                batch_predictions = self.models[member_idx]._predict_batch(
+                    result, batch_lcs
+                )
+                member_predictions[member_idx].append(batch_predictions)
+
+        # Combine the batches for each model.
+        member_predictions = [
+            {key: np.concatenate([i[key] for i in batches])
+             for key in batches[0]}
+            for batches in member_predictions
+        ]
+
+        # Estimate the absolute luminosity for each model.
+        for member_idx, predictions in enumerate(member_predictions):
+            if model.settings['predict_redshift']:
+                redshifts = predictions['predicted_redshift']
+            else:
+                redshifts = dataset.meta['redshift']
+            predictions['luminosity'], predictions['luminosity_error'] = \
+                self.models[member_idx]._compute_luminosity(
+                    predictions['amplitude'], predictions['amplitude_error'], redshifts
+                )
+
+        ensemble_predictions = {}
+
+        # Predictions that only depend on the data.
+        for key in _ENSEMBLE_DATA_KEYS:
+            ensemble_predictions[key] = member_predictions[0][key]
+
+        # Combined predictions
+        for key in _ENSEMBLE_AGGREGATE_KEYS:
+            if key not in member_predictions[0]:
+                continue
+
+            values = np.stack([i[key] for i in member_predictions], axis=1)
+            errors = np.stack([i[f'{key}_error'] for i in member_predictions], axis=1)
+
+            # Combine the uncertainty from each model with the scatter between the
+            # models.
+            ensemble_predictions[key] = np.mean(values, axis=1)
+            ensemble_predictions[f'{key}_error'] = np.sqrt(
+                np.mean(errors**2, axis=1) + np.var(values, axis=1)
+            )
+
+        # Predictions from each model
+        for key in member_predictions[0]:
+            if key in _ENSEMBLE_DATA_KEYS:
+                continue
+            ensemble_predictions[f'{key}_members'] = np.stack(
+                [i[key] for i in member_predictions], axis=1
+            )
+
+        return model._build_prediction_table(dataset.meta, ensemble_predictions)
+
+
+def load_ensemble(paths, device='cpu', threads=8):
+    """Load a set of ParSNIP models as an ensemble
+
+    Parameters
+    ----------
+    paths : List[str]
+        Paths to the models on disk, or names of built-in models.
+    device : str, optional
+        Torch device to load the models to, by default 'cpu'
+    threads : int, optional
+        Number of threads to use, by default 8
+
+    Returns
+    -------
+    `~ParsnipEnsemble`
+        Loaded ensemble
+    """
+    models = [load_model(path, device=device, threads=threads) for path in paths]
+    return ParsnipEnsemble(models)
@@ -1,9 +1,14 @@
+from collections import OrderedDict
 from tqdm import tqdm
+import contextlib
 import functools
 import multiprocessing
 import numpy as np
 import os
+import scipy.optimize
 import sys
+import threading
+import time
 
 from astropy.cosmology import Planck18
 import astropy.table
@@ -13,6 +18,8 @@ import pkg_resources
 import lcdata
 
 import torch
+import torch.distributed as dist
+import torch.utils.checkpoint
 import torch.utils.data
 from torch import nn, optim
 from torch.nn import functional as F
@@ -23,6 +30,7 @@ from .light_curve import preprocess_light_curve, grid_to_time, time_to_grid, \
 from .utils import frac_to_mag, parse_device, replace_nan_grads
 from .settings import parse_settings, default_model
 from .sncosmo import ParsnipSncosmoSource
+from .telemetry import FitTelemetry
 
 
 class ResidualBlock(nn.Module):
@@ -176,6 +184,7 @@ class ParsnipModel(nn.Module):
 
         # Set up the training
         self.epoch = 0
+        self._telemetry = None
         optim_kwargs = {
             'params': self.parameters(),
             'lr': self.settings['learning_rate'],
@@ -222,12 +231,154 @@ class ParsnipModel(nn.Module):
         self.band_interpolate_locations = \
             self.band_interpolate_locations.to(self.device)
         self.band_interpolate_weights = self.band_interpolate_weights.to(self.device)
+        self._reset_band_weight_cache()
 
     def save(self):
         """Save the model"""
         os.makedirs(os.path.dirname(self.path), exist_ok=True)
         torch.save([self.settings, self.state_dict()], self.path)
 
+    @property
+    def checkpoint_path(self):
+        """Path to the checkpoint containing the full training state of the model"""
+        return self.path + '.checkpoint'
+
+    def _get_training_state(self):
+        """Take a snapshot of the full training state of the model
+
+        All tensors are copied to the CPU so that training can continue while the
+        snapshot is being written to disk.
+
+        Returns
+        -------
+        dict
+            Snapshot of the training state
+        """
+        def copy_state(state):
+            if isinstance(state, torch.Tensor):
+                return state.detach().cpu().clone()
+            elif isinstance(state, dict):
+                return {key: copy_state(value) for key, value in state.items()}
+            elif isinstance(state, (list, tuple)):
+                return type(state)(copy_state(value) for value in state)
+            else:
+                return state
+
+        # Store the numpy random state as basic Python types so that it can be loaded
+        # with torch.load(weights_only=True).
+        numpy_rng_state = list(np.random.get_state())
+        numpy_rng_state[1] = numpy_rng_state[1].tolist()
+
+        rng_state = {
+            'torch': torch.get_rng_state(),
+            'numpy': numpy_rng_state,
+        }
+        if torch.cuda.is_available():
+            rng_state['cuda'] = torch.cuda.get_rng_state_all()
+
+        return {
+            'state_dict': copy_state(self.state_dict()),
+            'optimizer': copy_state(self.optimizer.state_dict()),
+            'scheduler': copy_state(self.scheduler.state_dict()),
+            'epoch': self.epoch,
+            'rng_state': rng_state,
+        }
+
+    def _write_checkpoint(self, state):
+        """Write a snapshot of the training state to disk
+
+        Both the model and the checkpoint are written to temporary files that are then
+        renamed, so an interrupted write never corrupts an existing file.
+
+        Parameters
+        ----------
+        state : dict
+            Snapshot of the training state from `_get_training_state`
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        for path, data in [
+            (self.path, [self.settings, state['state_dict']]),
+            (self.checkpoint_path, state),
+        ]:
+            temp_path = path + '.tmp'
+            torch.save(data, temp_path)
+            os.replace(temp_path, path)
+
+    def save_checkpoint(self, background=False):
+        """Save the model along with its full training state
+
+        In addition to the model itself, the checkpoint includes the optimizer and
+        learning rate scheduler states, the current epoch and the random number
+        generator states. Training can be resumed from the checkpoint with
+        `ParsnipModel.fit(resume=True)`.
+
+        Parameters
+        ----------
+        background : bool, optional
+            If True, write the checkpoint to disk on a background thread and return
+            immediately. Call `wait_for_checkpoint` to wait for the write to finish.
+            By default False
+        """
+        # Only write one checkpoint at a time.
+        self.wait_for_checkpoint()
+
+        state = self._get_training_state()
+
+        if not background:
+            self._write_checkpoint(state)
+            return
+
+        def write():
+            try:
+                self._write_checkpoint(state)
+            except Exception as e:
+                self._checkpoint_error = e
+
+        self._checkpoint_error = None
+        self._checkpoint_thread = threading.Thread(target=write, daemon=True)
+        self._checkpoint_thread.start()
+
+    def wait_for_checkpoint(self):
+        """Wait for any checkpoint being written in the background to finish"""
+        thread = getattr(self, '_checkpoint_thread', None)
+        if thread is None:
+            return
+
+        thread.join()
+        self._checkpoint_thread = None
+
+        if self._checkpoint_error is not None:
+            error = self._checkpoint_error
+            self._checkpoint_error = None
+            raise RuntimeError('Failed to write checkpoint') from error
+
+    def load_checkpoint(self, path=None):
+        """Restore the full training state of the model from a checkpoint
+
+        Parameters
+        ----------
+        path : str, optional
+            Path to the checkpoint, by default `checkpoint_path`
+        """
+        if path is None:
+            path = self.checkpoint_path
+
+        state = torch.load(path, self.device)
+
+        self.load_state_dict(state['state_dict'])
+        self.optimizer.load_state_dict(state['optimizer'])
+        self.scheduler.load_state_dict(state['scheduler'])
+        self.epoch = state['epoch']
+
+        rng_state = state['rng_state']
+        torch.set_rng_state(rng_state['torch'].cpu())
+        numpy_rng_state = list(rng_state['numpy'])
+        numpy_rng_state[1] = np.array(numpy_rng_state[1], dtype=np.uint32)
+        np.random.set_state(tuple(numpy_rng_state))
+        if 'cuda' in rng_state and torch.cuda.is_available():
+            torch.cuda.set_rng_state_all([i.cpu() for i in rng_state['cuda']])
+
     def _setup_band_weights(self):
         """Setup the interpolation for the band weights used for photometry"""
         # Build the model in log wavelength
@@ -283,23 +434,175 @@ class ParsnipModel(nn.Module):
 
             band_weights.append(band_weight)
 
+        band_weights = np.array(band_weights)
+
+        # Only keep part of the table if requested. The weights vary smoothly, so with
+        # cubic interpolation we can get away with a much coarser table.
+        stride = self.settings['band_table_stride']
+        band_weights = band_weights[:, ::stride]
+        band_spacing = band_spacing * stride
+
+        # Cubic interpolation uses one table entry before and two entries after the
+        # location that is being sampled, so we pad the table with zeros. Linear
+        # interpolation only needs one entry after.
+        if self.settings['band_interpolation'] == 'cubic':
+            table_offset = 1
+            band_weights = np.pad(band_weights, ((0, 0), (1, 2)))
+        elif self.settings['band_interpolation'] == 'linear':
+            table_offset = 0
+            band_weights = np.pad(band_weights, ((0, 0), (0, 1)))
+        else:
+            raise ValueError(
+                f"Unknown band interpolation '{self.settings['band_interpolation']}'. "
+                "Must be 'linear' or 'cubic'."
+            )
+
         # Get the locations that should be sampled at redshift 0. We can scale these to
         # get the locations at any redshift.
-        band_interpolate_locations = torch.arange(
-            0,
-            self.settings['spectrum_bins'] * self.settings['band_oversampling'],
-            self.settings['band_oversampling']
+        band_interpolate_step = self.settings['band_oversampling'] / stride
+        band_interpolate_locations = (
+            table_offset
+            + torch.arange(self.settings['spectrum_bins']) * band_interpolate_step
         )
 
+        # Find the range of the table where the weights of each band are nonzero. This
+        # is used to only decode the parts of the spectra that overlap each band.
+        band_windows = []
+        for band_weight in band_weights:
+            nonzero = np.nonzero(band_weight)[0]
+            if len(nonzero) == 0:
+                band_windows.append((0, -1))
+            else:
+                band_windows.append((nonzero[0], nonzero[-1]))
+
         # Save the variables that we need to do interpolation.
+        self.band_interpolate_windows = band_windows
         self.band_interpolate_locations = band_interpolate_locations.to(self.device)
+        self.band_interpolate_offset = table_offset
+        self.band_interpolate_step = band_interpolate_step
         self.band_interpolate_spacing = band_spacing
         self.band_interpolate_weights = torch.FloatTensor(band_weights).to(self.device)
         self.model_wave = 10**(model_log_wave)
 
+        self._reset_band_weight_cache()
+
+    def _reset_band_weight_cache(self):
+        """Clear the cache of interpolated band weights and its counters"""
+        self._band_weight_cache = OrderedDict()
+        self._band_weight_cache_hits = 0
+        self._band_weight_cache_misses = 0
+
+    def band_weight_cache_info(self):
+        """Get statistics for the cache of interpolated band weights
+
+        The cache is enabled with settings['band_weight_cache_size'].
+
+        Returns
+        -------
+        dict
+            Dictionary with the number of cache hits and misses, the hit rate, the
+            current number of redshifts in the cache and the maximum size of the cache.
+        """
+        lookups = self._band_weight_cache_hits + self._band_weight_cache_misses
+
+        return {
+            'hits': self._band_weight_cache_hits,
+            'misses': self._band_weight_cache_misses,
+            'hit_rate': self._band_weight_cache_hits / lookups if lookups else np.nan,
+            'size': len(self._band_weight_cache),
+            'max_size': self.settings['band_weight_cache_size'],
+        }
+
     def _calculate_band_weights(self, redshifts):
         """Calculate the band weights for a given set of redshifts
 
+        If settings['band_weight_cache_size'] is nonzero and gradients are disabled,
+        the band weights are looked up in an LRU cache and only calculated for
+        redshifts that are missing from it. Looking up the redshifts requires copying
+        them to the CPU, which synchronizes with the GPU for every batch, so the cache
+        isn't used when gradients are enabled, e.g. during training.
+
+        Parameters
+        ----------
+        redshifts : List[float]
+            Redshifts to calculate the band weights at
+
+        Returns
+        -------
+        `~numpy.ndarray`
+            Band weights for each redshift/band combination
+        """
+        if (self.settings['band_weight_cache_size'] > 0
+                and not torch.is_grad_enabled() and not redshifts.requires_grad):
+            return self._calculate_cached_band_weights(redshifts)
+        else:
+            return self._interpolate_band_weights(redshifts)
+
+    def _calculate_cached_band_weights(self, redshifts):
+        """Calculate the band weights for a given set of redshifts using the cache
+
+        Parameters
+        ----------
+        redshifts : `~torch.FloatTensor`
+            Redshifts to calculate the band weights at
+
+        Returns
+        -------
+        `~torch.FloatTensor`
+            Band weights for each redshift/band combination
+        """
+        cache = self._band_weight_cache
+        max_size = self.settings['band_weight_cache_size']
+        tolerance = self.settings['band_weight_cache_tolerance']
+
+        # Figure out the cache key for each redshift. If we have a tolerance, then the
+        # band weights are evaluated at the rounded redshift.
+        redshifts = redshifts.detach()
+        if tolerance > 0:
+            keys = np.round(redshifts.cpu().numpy() / tolerance).astype(np.int64)
+            unique_keys, inverse = np.unique(keys, return_inverse=True)
+            unique_redshifts = unique_keys * tolerance
+        else:
+            keys = redshifts.cpu().numpy()
+            unique_keys, inverse = np.unique(keys, return_inverse=True)
+            unique_redshifts = unique_keys
+
+        # Look up each redshift in the cache.
+        band_weights = [None] * len(unique_keys)
+        missing = []
+        for idx, key in enumerate(unique_keys.tolist()):
+            if key in cache:
+                cache.move_to_end(key)
+                band_weights[idx] = cache[key]
+                self._band_weight_cache_hits += 1
+            else:
+                missing.append(idx)
+                self._band_weight_cache_misses += 1
+
+        # Calculate the band weights for the redshifts that are missing all at once,
+        # and add them to the cache.
+        if missing:
+            missing_redshifts = torch.as_tensor(
+                unique_redshifts[missing], dtype=redshifts.dtype,
+                device=redshifts.device
+            )
+            missing_band_weights = self._interpolate_band_weights(missing_redshifts)
+            for idx, missing_band_weight in zip(missing, missing_band_weights):
+                band_weights[idx] = missing_band_weight
+                if len(cache) >= max_size:
+                    cache.popitem(last=False)
+                # Clone the band weights so that the cache doesn't keep the tensor
+                # for the whole batch alive.
+                cache[unique_keys[idx].item()] = missing_band_weight.clone()
+
+        band_weights = torch.stack(band_weights)
+        inverse = torch.as_tensor(inverse.reshape(-1), device=band_weights.device)
+
+        return band_weights[inverse]
+
+    def _interpolate_band_weights(self, redshifts):
+        """Interpolate the band weights for a given set of redshifts
+
         We have precomputed the weights for each bandpass, so we simply interpolate
         those weights at the desired redshifts. We are working in log-wavelength, so a
         change in redshift just gives us a shift in indices.
@@ -321,14 +624,28 @@ class ParsnipModel(nn.Module):
         )
         flat_locs = locs.flatten()
 
-        # Linear interpolation
         int_locs = flat_locs.long()
         remainders = flat_locs - int_locs
 
-        start = self.band_interpolate_weights[..., int_locs]
-        end = self.band_interpolate_weights[..., int_locs + 1]
+        if self.settings['band_interpolation'] == 'cubic':
+            # Cubic convolution (Catmull-Rom) interpolation
+            flat_result = (
+                self.band_interpolate_weights[..., int_locs - 1]
+                * (((-0.5 * remainders + 1.) * remainders - 0.5) * remainders)
+                + self.band_interpolate_weights[..., int_locs]
+                * ((1.5 * remainders - 2.5) * remainders**2 + 1.)
+                + self.band_interpolate_weights[..., int_locs + 1]
+                * (((-1.5 * remainders + 2.) * remainders + 0.5) * remainders)
+                + self.band_interpolate_weights[..., int_locs + 2]
+                * ((0.5 * remainders - 0.5) * remainders**2)
+            )
+        else:
+            # Linear interpolation
+            start = self.band_interpolate_weights[..., int_locs]
+            end = self.band_interpolate_weights[..., int_locs + 1]
+
+            flat_result = remainders * end + (1 - remainders) * start
 
-        flat_result = remainders * end + (1 - remainders) * start
         result = flat_result.reshape((-1,) + locs.shape).permute(1, 2, 0)
 
         # We need an extra term of 1 + z from the filter contraction.
@@ -336,7 +653,7 @@ class ParsnipModel(nn.Module):
 
         return result
 
-    def _test_band_weights(self, redshift, source='salt2-extended'):
+    def _test_band_weights(self, redshift, source='salt2-extended', verbose=True):
         """Test the accuracy of the band weights
 
         We compare sncosmo photometry to the photometry calculated by this class.
@@ -347,6 +664,13 @@ class ParsnipModel(nn.Module):
             Redshift to evaluate the model at
         source : str, optional
             SNCosmo source to use, by default 'salt2-extended'
+        verbose : bool, optional
+            Whether to print the photometry, by default True
+
+        Returns
+        -------
+        `~numpy.ndarray`
+            Ratio of the parsnip photometry to the sncosmo photometry in each band
         """
         model = sncosmo.Model(source=source)
 
@@ -362,12 +686,150 @@ class ParsnipModel(nn.Module):
             torch.FloatTensor([redshift]))[0].numpy()
         parsnip_photometry = np.sum(model_flux[:, None] * band_weights, axis=0)
 
-        print(f"z = {redshift}")
-        print(f"sncosmo photometry:     {sncosmo_photometry}")
-        print(f"parsnip photometry:     {parsnip_photometry}")
-        print(f"ratio:                  {parsnip_photometry / sncosmo_photometry}")
+        ratio = parsnip_photometry / sncosmo_photometry
+
+        if verbose:
+            print(f"z = {redshift}")
+            print(f"sncosmo photometry:     {sncosmo_photometry}")
+            print(f"parsnip photometry:     {parsnip_photometry}")
+            print(f"ratio:                  {ratio}")
+
+        return ratio
+
+    def _test_band_weights_accuracy(self, redshifts=None, configurations=None,
+                                    source='salt2-extended'):
+        """Test the accuracy and size of different band weight tables
+
+        For each configuration of the band weight tables, we compare the photometry to
+        sncosmo over a grid of redshifts with `_test_band_weights`. We print the size of
+        the table along with the largest fractional error in each band.
+
+        Parameters
+        ----------
+        redshifts : List[float], optional
+            Redshifts to evaluate the photometry at, by default 0.05 to 1 in steps of
+            0.05.
+        configurations : List[Tuple[str, int]], optional
+            Pairs of settings['band_interpolation'] and settings['band_table_stride']
+            to test. By default, we test linear interpolation of the full table and
+            cubic interpolation of progressively coarser tables.
+        source : str, optional
+            SNCosmo source to use, by default 'salt2-extended'
+        """
+        if redshifts is None:
+            redshifts = np.arange(0.05, 1.001, 0.05)
+
+        if configurations is None:
+            configurations = [
+                ('linear', 1),
+                ('cubic', 1),
+                ('cubic', 3),
+                ('cubic', 17),
+                ('cubic', 51),
+            ]
+
+        original_settings = (
+            self.settings['band_interpolation'], self.settings['band_table_stride']
+        )
+
+        print(f"Bands: {self.settings['bands']}")
+
+        try:
+            for interpolation, stride in configurations:
+                self.settings['band_interpolation'] = interpolation
+                self.settings['band_table_stride'] = stride
+                self._setup_band_weights()
+
+                ratios = np.array([
+                    self._test_band_weights(redshift, source, verbose=False)
+                    for redshift in redshifts
+                ])
+                max_errors = np.nanmax(np.abs(ratios - 1), axis=0)
+
+                table_size = (self.band_interpolate_weights.numel()
+                              * self.band_interpolate_weights.element_size())
+
+                print(f"{interpolation:>6s}, stride {stride:2d}: "
+                      f"table size {table_size / 1e6:6.3f} MB, "
+                      f"max fractional error {np.max(max_errors):.2e}")
+                print(f"    per band: {np.array2string(max_errors, precision=2)}")
+        finally:
+            (self.settings['band_interpolation'],
+             self.settings['band_table_stride']) = original_settings
+            self._setup_band_weights()
+
+    def _benchmark_encode_checkpoint(self, dataset, batch_sizes=[128, 256, 512],
+                                     repeats=3):
+        """Benchmark the memory usage and speed of encoder activation checkpointing
+
+        For each batch size, we run training steps with and without checkpointing of
+        the encoder and report the total size of the tensors that are saved for the
+        backward pass along with the average time for each step (forward pass, loss
+        and backward pass). The model weights are not updated.
+
+        Parameters
+        ----------
+        dataset : `~lcdata.Dataset`
+            Dataset to take the light curves from. It is repeated if it is smaller than
+            the largest batch size.
+        batch_sizes : List[int], optional
+            Batch sizes to evaluate, by default [128, 256, 512]
+        repeats : int, optional
+            Number of steps to average the timing over, by default 3
+        """
+        dataset = self.preprocess(dataset, verbose=False)
+        light_curves = list(dataset.light_curves)
+        light_curves = light_curves * int(np.ceil(max(batch_sizes) / len(light_curves)))
+
+        saved_bytes = 0
+
+        def pack_hook(tensor):
+            nonlocal saved_bytes
+            saved_bytes += tensor.numel() * tensor.element_size()
+            return tensor
+
+        def unpack_hook(tensor):
+            return tensor
+
+        original_setting = self.settings['encode_checkpoint']
+        self.train()
+
+        print(f"{'batch size':>10s} {'checkpoint':>10s} {'saved MB':>10s} "
+              f"{'step time (s)':>14s}")
 
-    def preprocess(self, dataset, chunksize=64, verbose=True):
+        try:
+            for batch_size in batch_sizes:
+                batch_lcs = self.augment_light_curves(light_curves[:batch_size],
+                                                      as_table=False)
+
+                for checkpoint in [False, True]:
+                    self.settings['encode_checkpoint'] = checkpoint
+                    step_times = []
+
+                    # Run one extra step to warm up.
+                    for i in range(repeats + 1):
+                        saved_bytes = 0
+                        self.zero_grad()
+
+                        start_time = time.perf_counter()
+                        with torch.autograd.graph.saved_tensors_hooks(pack_hook,
+                                                                      unpack_hook):
+                            result = self.forward(batch_lcs)
+                            loss = self.loss_function(result)
+                        loss.backward()
+                        if self.device.startswith('cuda'):
+                            torch.cuda.synchronize()
+                        step_times.append(time.perf_counter() - start_time)
+
+                    step_time = np.mean(step_times[1:])
+                    print(f"{batch_size:10d} {str(checkpoint):>10s} "
+                          f"{saved_bytes / 1e6:10.1f} {step_time:14.4f}")
+        finally:
+            self.settings['encode_checkpoint'] = original_setting
+            self.zero_grad()
+
+    def preprocess(self, dataset, chunksize=64, verbose=True, pool=None,
+                   processes=None):
         """Preprocess an lcdata dataset
 
         The preprocessing will be done over multiple threads. Set `ParsnipModel.threads`
@@ -382,6 +844,14 @@ class ParsnipModel(nn.Module):
             Number of light curves to process at a time, by default 64
         verbose : bool, optional
             Whether to show a progress bar, by default True
+        pool : `~multiprocessing.pool.Pool`, optional
+            Process pool to run the preprocessing in. By default, a new pool with
+            `processes` processes is started for each call. Passing in a pool avoids the
+            cost of starting one when preprocessing many datasets.
+        processes : int, optional
+            Number of processes to preprocess with if no pool is given, by default
+            `ParsnipModel.threads`. If this is 1, the preprocessing is done in the
+            current process.
 
         Returns
         -------
@@ -396,7 +866,10 @@ class ParsnipModel(nn.Module):
                 and np.all(dataset.meta['parsnip_preprocessed'])):
             return dataset
 
-        if self.threads == 1:
+        if processes is None:
+            processes = self.threads
+
+        if processes == 1 and pool is None:
             iterator = dataset.light_curves
             if verbose:
                 iterator = tqdm(dataset.light_curves, file=sys.stdout,
@@ -413,7 +886,12 @@ class ParsnipModel(nn.Module):
             func = functools.partial(preprocess_light_curve, settings=self.settings,
                                      raise_on_invalid=False)
 
-            with multiprocessing.Pool(self.threads) as p:
+            if pool is None:
+                context = multiprocessing.Pool(processes)
+            else:
+                context = contextlib.nullcontext(pool)
+
+            with context as p:
                 iterator = p.imap(func, dataset.light_curves, chunksize=chunksize)
                 if verbose:
                     iterator = tqdm(iterator, total=len(dataset.light_curves),
@@ -657,6 +1135,24 @@ class ParsnipModel(nn.Module):
 
         return data
 
+    def _repeat_data(self, data, count):
+        """Repeat the data for each light curve a given number of times
+
+        Parameters
+        ----------
+        data : dict
+            Data dictionary returned by `~ParsnipModel._get_data`
+        count : int
+            Number of times to repeat each light curve
+
+        Returns
+        -------
+        dict
+            Data dictionary with each light curve repeated `count` times. All of the
+            repeats of a given light curve are next to each other.
+        """
+        return {k: v.repeat_interleave(count, 0) for k, v in data.items()}
+
     def _build_model(self):
         """Build the model"""
         input_size = len(self.settings['bands']) * 2
@@ -820,12 +1316,29 @@ class ParsnipModel(nn.Module):
         `~torch.FloatTensor`
             Log-variance predictions for each latent variable
         """
+        if (self.settings['encode_checkpoint'] and self.training
+                and torch.is_grad_enabled()):
+            # Use activation checkpointing for the encoder. Only the inputs to each
+            # convolutional block and to each branch are kept for the backward pass,
+            # and everything else is recomputed.
+            def run_checkpointed(layer, x):
+                return torch.utils.checkpoint.checkpoint(
+                    layer, x, use_reentrant=False, preserve_rng_state=False
+                )
+        else:
+            def run_checkpointed(layer, x):
+                return layer(x)
+
         # Apply common encoder blocks
-        e = self.encode_layers(input_data)
+        num_blocks = len(self.settings['encode_conv_architecture'])
+        e = input_data
+        for block in self.encode_layers[:num_blocks]:
+            e = run_checkpointed(block, e)
+        e = run_checkpointed(self.encode_layers[num_blocks:], e)
 
         # Reference time branch. First, apply additional FC layers to get to an output
         # that has a single channel.
-        e_time = self.encode_time_layers(e)
+        e_time = run_checkpointed(self.encode_time_layers, e)
 
         # Apply the time-indexing layer to calculate the reference time. This is a
         # special layer that is invariant to translations of the input.
@@ -836,7 +1349,7 @@ class ParsnipModel(nn.Module):
         )
 
         # Latent space branch.
-        e_latent = self.encode_latent_layers(e)
+        e_latent = run_checkpointed(self.encode_latent_layers, e)
 
         # Predict mu and logvar
         encoding_mu = self.encode_mu_layer(e_latent)
@@ -853,6 +1366,43 @@ class ParsnipModel(nn.Module):
 
         return encoding_mu, encoding_logvar
 
+    def _calculate_color_scale(self, color):
+        """Calculate the scale that the color law applies at each wavelength
+
+        Parameters
+        ----------
+        color : `~torch.FloatTensor`
+            Color of each light curve
+
+        Returns
+        -------
+        `~torch.FloatTensor`
+            Scale to apply to the spectra at each wavelength for each light curve
+        """
+        return 10**(-0.4 * color[:, None] * self.color_law[None, :])
+
+    def _build_decoder_input(self, encoding, phases):
+        """Build the input to the decoder for a set of latent variables and phases
+
+        Parameters
+        ----------
+        encoding : `~torch.FloatTensor`
+            Coordinates in the ParSNIP intrinsic latent space for each light curve
+        phases : `~torch.FloatTensor`
+            Phases to decode each light curve at
+
+        Returns
+        -------
+        `~torch.FloatTensor`
+            Input to the decoder layers
+        """
+        scale_phases = phases / (self.settings['time_window'] // 2)
+
+        repeat_encoding = encoding[:, :, None].expand((-1, -1, scale_phases.shape[1]))
+        stack_encoding = torch.cat([repeat_encoding, scale_phases[:, None, :]], 1)
+
+        return stack_encoding
+
     def decode_spectra(self, encoding, phases, color, amplitude=None):
         """Predict the spectra at a given set of latent variables
 
@@ -873,17 +1423,14 @@ class ParsnipModel(nn.Module):
         `~torch.FloatTensor`
             Predicted spectra
         """
-        scale_phases = phases / (self.settings['time_window'] // 2)
-
-        repeat_encoding = encoding[:, :, None].expand((-1, -1, scale_phases.shape[1]))
-        stack_encoding = torch.cat([repeat_encoding, scale_phases[:, None, :]], 1)
+        stack_encoding = self._build_decoder_input(encoding, phases)
 
         # Apply intrinsic decoder
         model_spectra = self.decode_layers(stack_encoding)
 
         if color is not None:
             # Apply colors
-            apply_colors = 10**(-0.4 * color[:, None] * self.color_law[None, :])
+            apply_colors = self._calculate_color_scale(color)
             model_spectra = model_spectra * apply_colors[..., None]
 
         if amplitude is not None:
@@ -893,7 +1440,7 @@ class ParsnipModel(nn.Module):
         return model_spectra
 
     def decode(self, encoding, ref_times, color, times, redshifts, band_indices,
-               amplitude=None):
+               amplitude=None, return_spectra=True):
         """Predict the light curves for a given set of latent variables
 
         Parameters
@@ -913,11 +1460,16 @@ class ParsnipModel(nn.Module):
         amplitude : `~torch.FloatTensor`, optional
             Amplitude to scale each light curve by, by default no scaling will be
             applied
+        return_spectra : bool, optional
+            Whether to return the model spectra, by default True. If False, the color
+            and amplitude are applied to the band weights instead of the spectra, and
+            the photometry is calculated without building any other tensors that are as
+            large as the spectra. This uses much less memory.
 
         Returns
         -------
         `~torch.FloatTensor`
-            Model spectra
+            Model spectra, or None if return_spectra is False
         `~torch.FloatTensor`
             Model photometry
         """
@@ -926,97 +1478,382 @@ class ParsnipModel(nn.Module):
             / (1 + redshifts[:, None])
         )
 
+        if not return_spectra:
+            return None, self._decode_photometry(encoding, phases, color, redshifts,
+                                                 band_indices, amplitude)
+
         # Generate the restframe spectra
         model_spectra = self.decode_spectra(encoding, phases, color, amplitude)
 
         # Figure out the weights for each band
-        band_weights = self._calculate_band_weights(redshifts)
-        num_batches = band_indices.shape[0]
-        num_observations = band_indices.shape[1]
-        batch_indices = (
-            torch.arange(num_batches, device=encoding.device)
-            .repeat_interleave(num_observations)
-        )
-        obs_band_weights = (
-            band_weights[batch_indices, :, band_indices.flatten()]
-            .reshape((num_batches, num_observations, -1))
-            .permute(0, 2, 1)
-        )
+        with self._time_phase('band_weights'):
+            band_weights = self._calculate_band_weights(redshifts)
+            num_batches = band_indices.shape[0]
+            num_observations = band_indices.shape[1]
+            batch_indices = (
+                torch.arange(num_batches, device=encoding.device)
+                .repeat_interleave(num_observations)
+            )
+            obs_band_weights = (
+                band_weights[batch_indices, :, band_indices.flatten()]
+                .reshape((num_batches, num_observations, -1))
+                .permute(0, 2, 1)
+            )
 
         # Sum over each filter.
         model_flux = torch.sum(model_spectra * obs_band_weights, axis=1)
 
         return model_spectra, model_flux
 
-    def _reparameterize(self, mu, logvar, sample=True):
-        if sample:
-            std = torch.exp(0.5*logvar)
-            eps = torch.randn_like(std)
-            return mu + eps*std
-        else:
-            return mu
-
-    def _sample(self, encoding_mu, encoding_logvar, sample=True):
-        sample_encoding = self._reparameterize(encoding_mu, encoding_logvar,
-                                               sample=sample)
+    def _decode_photometry(self, encoding, phases, color, redshifts, band_indices,
+                           amplitude=None):
+        """Predict the photometry for a given set of latent variables
 
-        time_sigma = self.settings['time_sigma']
-        color_sigma = self.settings['color_sigma']
+        This is equivalent to `~ParsnipModel.decode` but does not return the model
+        spectra. The color and amplitude only depend on the wavelength, so we apply
+        them to the band weights for each light curve rather than to the full spectra.
+        The photometry is then calculated for every band with a single batched matrix
+        multiplication, and we pull out the band of each observation.
 
-        if self.settings['predict_redshift']:
-            redshift = torch.exp(sample_encoding[:, -1] - 1)
-            sample_encoding = sample_encoding[:, :-1]
-        else:
-            redshift = torch.zeros_like(sample_encoding[:, 0])
+        To keep the memory usage bounded, the observations are decoded in chunks that
+        fit within settings['decode_memory_budget'].
 
-        # Rescale variables
-        ref_times = sample_encoding[:, 0] * time_sigma
-        color = sample_encoding[:, 1] * color_sigma
-        encoding = sample_encoding[:, 2:]
+        Parameters
+        ----------
+        encoding : `~torch.FloatTensor`
+            Coordinates in the ParSNIP intrinsic latent space for each light curve
+        phases : `~torch.FloatTensor`
+            Restframe phases to predict each light curve at
+        color : `~torch.FloatTensor`
+            Color of each light curve
+        redshifts : `~torch.FloatTensor`
+            Redshift of each light curve
+        band_indices : `~torch.LongTensor`
+            Band indices for each observation
+        amplitude : `~torch.FloatTensor`, optional
+            Amplitude to scale each light curve by, by default no scaling will be
+            applied
 
-        # Constrain the color and reference time so that things don't go to crazy values
-        # and throw everything off with floating point precision errors. This will not
-        # be a concern for a properly trained model, but things can go wrong early in
-        # the training at high learning rates.
-        ref_times = torch.clamp(ref_times, -10. * time_sigma, 10. * time_sigma)
-        color = torch.clamp(color, -10. * color_sigma, 10. * color_sigma)
-        redshift = torch.clamp(redshift, 0., self.settings['max_redshift'])
+        Returns
+        -------
+        `~torch.FloatTensor`
+            Model photometry
+        """
+        # Figure out the weights for each band, including the color and amplitude.
+        with self._time_phase('band_weights'):
+            band_weights = self._calculate_band_weights(redshifts)
+            if color is not None:
+                band_weights = (
+                    band_weights * self._calculate_color_scale(color)[..., None]
+                )
+            if amplitude is not None:
+                band_weights = band_weights * amplitude[:, None, None]
+
+        chunk_size = self._get_decode_chunk_size(phases.shape[0])
+
+        model_flux = []
+        for start in range(0, phases.shape[1], chunk_size):
+            chunk_phases = phases[:, start:start + chunk_size]
+            chunk_band_indices = band_indices[:, start:start + chunk_size]
+
+            if self.settings['decode_sparse_photometry']:
+                model_flux.append(self._decode_sparse_photometry(
+                    encoding, chunk_phases, redshifts, band_weights, chunk_band_indices
+                ))
+                continue
+
+            # Generate the intrinsic restframe spectra
+            model_spectra = self.decode_spectra(encoding, chunk_phases, None)
+
+            # Calculate the photometry in every band, and keep the band of each
+            # observation.
+            band_flux = torch.bmm(model_spectra.transpose(1, 2), band_weights)
+            model_flux.append(
+                torch.gather(band_flux, 2, chunk_band_indices[..., None])[..., 0]
+            )
 
-        return redshift, ref_times, color, encoding
+        if len(model_flux) == 1:
+            return model_flux[0]
+        else:
+            return torch.cat(model_flux, 1)
 
-    def forward(self, light_curves, sample=True, to_numpy=False):
-        """Run a set of light curves through the full ParSNIP model
+    def _decode_sparse_photometry(self, encoding, phases, redshifts, band_weights,
+                                  band_indices):
+        """Predict the photometry by only decoding the spectrum bins seen by each band
 
-        We use variational inference to predict the latent representation of each light
-        curve, and we then use the generative model to predict the light curves for
-        those representations.
+        Most bandpasses only cover a small part of the spectrum. We group the
+        observations by band, and for each band we only evaluate the final layer of the
+        decoder for the spectrum bins where that band has nonzero weight at the
+        redshifts in this batch. The photometry is then computed with a batched
+        contraction over only those bins.
 
         Parameters
         ----------
-        light_curves : List[`~astropy.table.Table`]
-            List of light curves
-        sample : bool, optional
-            If True (default), sample from the posterior distribution. If False, use the
-            MAP.
-        to_numpy : bool, optional
-            Whether to convert the outputs to numpy arrays, by default False
+        encoding : `~torch.FloatTensor`
+            Coordinates in the ParSNIP intrinsic latent space for each light curve
+        phases : `~torch.FloatTensor`
+            Restframe phases to predict each light curve at
+        redshifts : `~torch.FloatTensor`
+            Redshift of each light curve
+        band_weights : `~torch.FloatTensor`
+            Band weights for each light curve including the color and amplitude
+        band_indices : `~torch.LongTensor`
+            Band indices for each observation
 
         Returns
         -------
-        dict
-            Result dictionary. If to_numpy is True, all of the elements will be numpy
-            arrays. Otherwise, they will be PyTorch tensors on the model's device.
+        `~torch.FloatTensor`
+            Model photometry
         """
-        # Extract the data that we need and move it to the right device.
-        data = self._get_data(light_curves)
-
+        num_lcs, num_observations = band_indices.shape
+        num_bands = len(self.settings['bands'])
+        num_bins = self.settings['spectrum_bins']
+        offset = self.band_interpolate_offset
+        step = self.band_interpolate_step
+
+        model_flux = torch.zeros((num_lcs, num_observations), device=encoding.device)
+        if num_observations == 0:
+            return model_flux
+
+        # Evaluate everything up to the final layer of the decoder.
+        stack_encoding = self._build_decoder_input(encoding, phases)
+        hidden = self.decode_layers[:-2](stack_encoding)
+        final_weight = self.decode_layers[-2].weight[:, :, 0]
+        final_bias = self.decode_layers[-2].bias
+        final_activation = self.decode_layers[-1]
+
+        # Figure out how far the band weights are shifted for the redshifts in this
+        # batch. See _interpolate_band_weights for details. The band weights may have
+        # been evaluated at rounded redshifts if they were cached, so we pad the range
+        # by the tolerance of the cache.
+        tolerance = self.settings['band_weight_cache_tolerance']
+        min_redshift = redshifts.detach().min().item() - tolerance
+        max_redshift = redshifts.detach().max().item() + tolerance
+        min_shift = np.log10(1 + max(min_redshift, 0.)) / self.band_interpolate_spacing
+        max_shift = np.log10(1 + max_redshift) / self.band_interpolate_spacing
+
+        # Group the observations by band. For each light curve, we sort the
+        # observations by band and figure out where each band starts.
+        order = torch.argsort(band_indices, dim=1, stable=True)
+        band_counts = F.one_hot(band_indices, num_bands).sum(axis=1)
+        band_offsets = torch.cumsum(band_counts, 1) - band_counts
+        max_band_counts = band_counts.max(axis=0).values.tolist()
+
+        for band_idx in range(num_bands):
+            max_count = max_band_counts[band_idx]
+            window_start, window_end = self.band_interpolate_windows[band_idx]
+
+            # Figure out which spectrum bins the band can overlap. A bin contributes
+            # if any of the table entries used to interpolate it are nonzero. This is
+            # at most two entries on either side for cubic interpolation.
+            start_bin = max(
+                0, int(np.floor((window_start - 2 - offset - max_shift) / step))
+            )
+            end_bin = min(
+                num_bins, int(np.ceil((window_end + 2 - offset - min_shift) / step)) + 1
+            )
+
+            if max_count == 0 or start_bin >= end_bin:
+                continue
+
+            # Pull out the observations in this band, padding to the same length for
+            # every light curve.
+            positions = (band_offsets[:, band_idx, None]
+                         + torch.arange(max_count, device=encoding.device))
+            valid = positions < (band_offsets + band_counts)[:, band_idx, None]
+            obs_indices = order.gather(1, positions.clamp(max=num_observations - 1))
+            band_hidden = hidden.gather(
+                2, obs_indices[:, None, :].expand(-1, hidden.shape[1], -1)
+            )
+
+            # Decode only the spectrum bins that the band overlaps, and integrate them.
+            band_spectra = final_activation(
+                torch.einsum('wh,bhn->bwn', final_weight[start_bin:end_bin],
+                             band_hidden)
+                + final_bias[start_bin:end_bin, None]
+            )
+            band_flux = torch.einsum('bwn,bw->bn', band_spectra,
+                                     band_weights[:, start_bin:end_bin, band_idx])
+
+            model_flux = model_flux.scatter_add(1, obs_indices, band_flux * valid)
+
+        return model_flux
+
+    def _test_sparse_photometry(self, dataset):
+        """Test that the sparse photometry matches the dense photometry
+
+        We run the light curves through the model with and without
+        settings['decode_sparse_photometry'] and compare the model photometry and the
+        time taken.
+
+        Parameters
+        ----------
+        dataset : `~lcdata.Dataset`
+            Dataset to use for the comparison
+
+        Returns
+        -------
+        float
+            Maximum difference between the sparse and dense photometry relative to the
+            largest dense photometry value
+        """
+        dataset = self.preprocess(dataset, verbose=False)
+        light_curves = list(dataset.light_curves)
+
+        original_setting = self.settings['decode_sparse_photometry']
+        model_flux = {}
+        elapsed_time = {}
+
+        try:
+            with torch.no_grad():
+                for sparse in [False, True]:
+                    self.settings['decode_sparse_photometry'] = sparse
+                    start_time = time.perf_counter()
+                    result = self.forward(light_curves, sample=False,
+                                          return_spectra=False)
+                    elapsed_time[sparse] = time.perf_counter() - start_time
+                    model_flux[sparse] = result['model_flux'].cpu().numpy()
+        finally:
+            self.settings['decode_sparse_photometry'] = original_setting
+
+        diff = np.abs(model_flux[True] - model_flux[False])
+        scale = np.max(np.abs(model_flux[False]))
+
+        max_relative_diff = float(np.max(diff) / scale)
+
+        print(f"Maximum absolute difference:  {np.max(diff):.3g}")
+        print(f"Maximum relative difference:  {max_relative_diff:.3g}")
+        print(f"Dense photometry time:        {elapsed_time[False]:.4f} s")
+        print(f"Sparse photometry time:       {elapsed_time[True]:.4f} s")
+
+        return max_relative_diff
+
+    def _get_decode_chunk_size(self, batch_size):
+        """Determine how many observations to decode at a time
+
+        We estimate the memory needed to decode a single observation for every light
+        curve in the batch from the sizes of the decoder layers, and choose the number
+        of observations so that the total stays within
+        settings['decode_memory_budget'] (in MB).
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of light curves being decoded
+
+        Returns
+        -------
+        int
+            Number of observations to decode at a time
+        """
+        # Every decoder layer has an output followed by an activation, and we also
+        # have the input to the decoder and the photometry in every band.
+        layer_sizes = (
+            self.settings['latent_size'] + 1
+            + 2 * sum(self.settings['decode_architecture'])
+            + 2 * self.settings['spectrum_bins']
+            + len(self.settings['bands'])
+        )
+        bytes_per_observation = 4 * layer_sizes * max(batch_size, 1)
+        budget = self.settings['decode_memory_budget'] * 1024**2
+
+        return max(1, int(budget // bytes_per_observation))
+
+    def _reparameterize(self, mu, logvar, sample=True):
+        if sample:
+            std = torch.exp(0.5*logvar)
+            eps = torch.randn_like(std)
+            return mu + eps*std
+        else:
+            return mu
+
+    def _sample(self, encoding_mu, encoding_logvar, sample=True):
+        sample_encoding = self._reparameterize(encoding_mu, encoding_logvar,
+                                               sample=sample)
+
+        return self._parse_encoding(sample_encoding)
+
+    def _parse_encoding(self, sample_encoding):
+        """Convert an encoding vector to the parameters used by the decoder"""
+        time_sigma = self.settings['time_sigma']
+        color_sigma = self.settings['color_sigma']
+
+        if self.settings['predict_redshift']:
+            redshift = torch.exp(sample_encoding[:, -1] - 1)
+            sample_encoding = sample_encoding[:, :-1]
+        else:
+            redshift = torch.zeros_like(sample_encoding[:, 0])
+
+        # Rescale variables
+        ref_times = sample_encoding[:, 0] * time_sigma
+        color = sample_encoding[:, 1] * color_sigma
+        encoding = sample_encoding[:, 2:]
+
+        # Constrain the color and reference time so that things don't go to crazy values
+        # and throw everything off with floating point precision errors. This will not
+        # be a concern for a properly trained model, but things can go wrong early in
+        # the training at high learning rates.
+        ref_times = torch.clamp(ref_times, -10. * time_sigma, 10. * time_sigma)
+        color = torch.clamp(color, -10. * color_sigma, 10. * color_sigma)
+        redshift = torch.clamp(redshift, 0., self.settings['max_redshift'])
+
+        return redshift, ref_times, color, encoding
+
+    def forward(self, light_curves, sample=True, to_numpy=False, count=None,
+                return_spectra=True):
+        """Run a set of light curves through the full ParSNIP model
+
+        We use variational inference to predict the latent representation of each light
+        curve, and we then use the generative model to predict the light curves for
+        those representations.
+
+        Parameters
+        ----------
+        light_curves : List[`~astropy.table.Table`]
+            List of light curves
+        sample : bool, optional
+            If True (default), sample from the posterior distribution. If False, use the
+            MAP.
+        to_numpy : bool, optional
+            Whether to convert the outputs to numpy arrays, by default False
+        count : int, optional
+            Number of samples to draw for each light curve. The encoder is only run once
+            for each light curve, and all of the samples are decoded in a single batch.
+            The outputs will have `len(light_curves) * count` entries with all of the
+            samples for a given light curve next to each other. By default None, which
+            draws a single sample for each light curve.
+        return_spectra : bool, optional
+            Whether to include the model spectra in the result, by default True. If
+            False, the photometry is calculated without keeping the full spectra (see
+            `~ParsnipModel.decode`), which uses much less memory. The result can then
+            not be used to compute the regularization penalty in
+            `~ParsnipModel.loss_function`, so this should only be used for inference.
+
+        Returns
+        -------
+        dict
+            Result dictionary. If to_numpy is True, all of the elements will be numpy
+            arrays. Otherwise, they will be PyTorch tensors on the model's device.
+        """
+        # Extract the data that we need and move it to the right device.
+        with self._time_phase('get_data'):
+            data = self._get_data(light_curves)
+
         # Encode the light curves.
-        encoding_mu, encoding_logvar = self.encode(data['input_data'])
+        with self._time_phase('encode'):
+            encoding_mu, encoding_logvar = self.encode(data['input_data'])
+
+        if count is not None and count > 1:
+            # Draw multiple samples for each light curve from the same encoding.
+            data = self._repeat_data(data, count)
+            encoding_mu = encoding_mu.repeat_interleave(count, 0)
+            encoding_logvar = encoding_logvar.repeat_interleave(count, 0)
 
         # Sample from the latent space.
-        predicted_redshifts, ref_times, color, encoding = self._sample(
-            encoding_mu, encoding_logvar, sample=sample
-        )
+        sample_encoding = self._reparameterize(encoding_mu, encoding_logvar,
+                                               sample=sample)
+        predicted_redshifts, ref_times, color, encoding = \
+            self._parse_encoding(sample_encoding)
 
         if self.settings['predict_redshift']:
             use_redshifts = predicted_redshifts
@@ -1029,9 +1866,11 @@ class ParsnipModel(nn.Module):
         obs_weight = data['compare_data'][:, 3]
 
         # Decode the light curves
-        model_spectra, model_flux = self.decode(
-            encoding, ref_times, color, time, use_redshifts, data['band_indices']
-        )
+        with self._time_phase('decode'):
+            model_spectra, model_flux = self.decode(
+                encoding, ref_times, color, time, use_redshifts, data['band_indices'],
+                return_spectra=return_spectra
+            )
 
         # Analytically evaluate the conditional distribution for the amplitude and
         # sample from it.
@@ -1039,7 +1878,6 @@ class ParsnipModel(nn.Module):
                                                                  obs_flux)
         amplitude = self._reparameterize(amplitude_mu, amplitude_logvar, sample=sample)
         model_flux = model_flux * amplitude[:, None]
-        model_spectra = model_spectra * amplitude[:, None, None]
 
         result = {
             'ref_times': ref_times,
@@ -1054,13 +1892,16 @@ class ParsnipModel(nn.Module):
             'obs_weight': obs_weight,
             'band_indices': data['band_indices'],
             'model_flux': model_flux,
-            'model_spectra': model_spectra,
             'encoding_mu': encoding_mu,
             'encoding_logvar': encoding_logvar,
+            'sample_encoding': sample_encoding,
             'amplitude_mu': amplitude_mu,
             'amplitude_logvar': amplitude_logvar,
         }
 
+        if return_spectra:
+            result['model_spectra'] = model_spectra * amplitude[:, None, None]
+
         if self.settings['predict_redshift']:
             result['photoz'] = data['photoz']
             result['photoz_error'] = data['photoz_error']
@@ -1076,20 +1917,60 @@ class ParsnipModel(nn.Module):
 
         # With augmentation, can very rarely end up with no light curve points. Handle
         # that gracefully by setting the amplitude to 0 with a very large uncertainty.
-        denom[denom == 0.] = 1e-5
+        # Note: we avoid in-place masked assignment here so that this can be used with
+        # torch.func.vmap.
+        denom = torch.where(denom == 0., torch.full_like(denom, 1e-5), denom)
 
         amplitude_mu = num / denom
         amplitude_logvar = torch.log(1. / denom)
 
         return amplitude_mu, amplitude_logvar
 
+    def _compute_nll(self, data, redshifts, ref_times, color, encoding, amplitude):
+        """Compute the negative log-likelihood of the observations for a set of
+        parameters
+
+        This is the same reconstruction term that is used in
+        `~ParsnipModel.loss_function`.
+
+        Parameters
+        ----------
+        data : dict
+            Data dictionary returned by `~ParsnipModel._get_data`
+        redshifts : `~torch.FloatTensor`
+            Redshift of each light curve
+        ref_times : `~torch.FloatTensor`
+            Reference time of each light curve
+        color : `~torch.FloatTensor`
+            Color of each light curve
+        encoding : `~torch.FloatTensor`
+            Coordinates in the ParSNIP intrinsic latent space for each light curve
+        amplitude : `~torch.FloatTensor`
+            Amplitude of each light curve
+
+        Returns
+        -------
+        `~torch.FloatTensor`
+            Negative log-likelihood of each light curve
+        """
+        time = data['compare_data'][:, 0]
+        obs_flux = data['compare_data'][:, 1]
+        obs_weight = data['compare_data'][:, 3]
+
+        _, model_flux = self.decode(encoding, ref_times, color, time, redshifts,
+                                    data['band_indices'], amplitude,
+                                    return_spectra=False)
+
+        return torch.sum(0.5 * obs_weight * (obs_flux - model_flux)**2, axis=1)
+
     def loss_function(self, result, return_components=False, return_individual=False):
         """Compute the loss function for a set of light curves
 
         Parameters
         ----------
         result : dict
-            Output of `~ParsnipModel.forward`
+            Output of `~ParsnipModel.forward`. If it doesn't include the model spectra,
+            the regularization penalty will be zero.
         return_components : bool, optional
             Whether to return the individual parts of the loss function, by default
             False.
@@ -1117,12 +1998,17 @@ class ParsnipModel(nn.Module):
                       - result['encoding_mu'].pow(2)
                       - result['encoding_logvar'].exp())
 
-        # Regularization of spectra
-        diff = (
-            (result['model_spectra'][:, 1:, :] - result['model_spectra'][:, :-1, :])
-            / (result['model_spectra'][:, 1:, :] + result['model_spectra'][:, :-1, :])
-        )
-        penalty = self.settings['penalty'] * diff**2
+        # Regularization of spectra. This requires the full model spectra, so it isn't
+        # available if they weren't returned by forward.
+        if 'model_spectra' in result:
+            diff = (
+                (result['model_spectra'][:, 1:, :] - result['model_spectra'][:, :-1, :])
+                / (result['model_spectra'][:, 1:, :]
+                   + result['model_spectra'][:, :-1, :])
+            )
+            penalty = self.settings['penalty'] * diff**2
+        else:
+            penalty = torch.zeros_like(result['model_flux'][:, None, :1])
 
         # Amplitude probability for the importance sampling integral
         amp_prob = -0.5 * ((result['amplitude'] - result['amplitude_mu'])**2
@@ -1160,7 +2046,50 @@ class ParsnipModel(nn.Module):
         else:
             return nll + kld + penalty + amp_prob + redshift_nll
 
-    def score(self, dataset, rounds=1, return_components=False, sample=True):
+    def importance_weighted_loss(self, result, count):
+        """Compute the importance-weighted loss function for a set of light curves
+
+        This computes the negative of the importance-weighted lower bound on the
+        log-likelihood (Burda et al. 2015) using multiple samples from the posterior
+        for each light curve. For a single sample, this is a stochastic estimate of the
+        loss returned by `~ParsnipModel.loss_function`. The bound becomes tighter as
+        the number of samples increases.
+
+        Parameters
+        ----------
+        result : dict
+            Output of `~ParsnipModel.forward` with the given count
+        count : int
+            Number of samples for each light curve
+
+        Returns
+        -------
+        `~torch.FloatTensor`
+            Importance-weighted loss function for each light curve
+        """
+        nll, kld, penalty, amp_prob, redshift_nll = self.loss_function(
+            result, return_components=True, return_individual=True
+        )
+
+        # Replace the analytic KL divergence with its single sample estimate
+        # log q(z|y) - log p(z) so that we get valid importance weights.
+        sample_encoding = result['sample_encoding']
+        encoding_mu = result['encoding_mu']
+        encoding_logvar = result['encoding_logvar']
+        kld_sample = torch.sum(
+            0.5 * sample_encoding**2
+            - 0.5 * (sample_encoding - encoding_mu)**2 / encoding_logvar.exp()
+            - 0.5 * encoding_logvar,
+            axis=1
+        )
+
+        log_weights = -(nll + kld_sample + penalty + amp_prob + redshift_nll)
+        log_weights = log_weights.reshape((-1, count))
+
+        return -(torch.logsumexp(log_weights, 1) - np.log(count))
+
+    def score(self, dataset, rounds=1, return_components=False, sample=True, count=1,
+              importance_weighted=False, target_error=None, max_rounds=100):
         """Evaluate the loss function on a given dataset.
 
         Parameters
@@ -1174,36 +2103,498 @@ class ParsnipModel(nn.Module):
         return_components : bool, optional
             Whether to return the individual parts of the loss function, by default
             False. See `~ParsnipModel.loss_function` for details.
+        sample : bool, optional
+            If True (default), sample from the posterior distribution. If False, use the
+            MAP.
+        count : int, optional
+            Number of posterior samples to draw for each light curve in each round. The
+            encoder is only run once for all of the samples. This has the same effect
+            as increasing the number of rounds, but is much faster. Default 1.
+        importance_weighted : bool, optional
+            If True, return the importance-weighted loss using `count` samples for each
+            light curve (see `~ParsnipModel.importance_weighted_loss`) rather than the
+            average loss over all samples. By default False.
+        target_error : float, optional
+            If specified, keep running rounds until the standard error on the loss
+            function is below this value or max_rounds is reached. In this case,
+            `rounds` is the minimum number of rounds to run. The standard error is
+            estimated from the variance of the loss of each light curve across rounds.
+            By default None, which runs a fixed number of rounds.
+        max_rounds : int, optional
+            Maximum number of rounds to run if target_error is specified, by default
+            100.
 
         Returns
         -------
         loss
             Computed loss function
+        loss_error
+            Standard error on the computed loss function. Only returned if target_error
+            is specified.
         """
+        if importance_weighted and return_components:
+            raise ValueError("Can't return components of the importance-weighted loss.")
+
         self.eval()
 
-        total_loss = 0
-        total_count = 0
+        if target_error is None:
+            max_rounds = rounds
+        else:
+            # We need at least two rounds to estimate the uncertainty.
+            rounds = max(rounds, 2)
+            max_rounds = max(rounds, max_rounds)
 
         loader = self.get_data_loader(dataset)
 
-        # Compute the loss
-        for round in range(rounds):
-            for batch_lcs in loader:
-                result = self.forward(batch_lcs, sample=sample)
-                loss = self.loss_function(result, return_components)
+        # Running mean and sum of squared differences of the loss for each light curve
+        # across rounds (Welford's algorithm).
+        loss_mean = 0.
+        loss_m2 = 0.
+        num_rounds = 0
+        loss_error = np.nan
+
+        with torch.no_grad():
+            while num_rounds < max_rounds:
+                # Compute the loss for each light curve.
+                round_loss = []
+                for batch_lcs in loader:
+                    result = self.forward(batch_lcs, sample=sample, count=count)
+
+                    if importance_weighted:
+                        loss = self.importance_weighted_loss(result, count)
+                    else:
+                        loss = self.loss_function(result, return_components,
+                                                  return_individual=True)
+                        # Average over the samples for each light curve.
+                        loss = loss.reshape(loss.shape[:-1] + (-1, count)).mean(axis=-1)
+
+                    round_loss.append(loss.cpu().numpy().astype(np.float64))
+
+                round_loss = np.concatenate(round_loss, axis=-1)
+
+                num_rounds += 1
+                delta = round_loss - loss_mean
+                loss_mean = loss_mean + delta / num_rounds
+                loss_m2 = loss_m2 + delta * (round_loss - loss_mean)
+
+                if target_error is None or num_rounds < rounds:
+                    continue
+
+                # Estimate the standard error on the mean loss over all light curves.
+                total_m2 = np.sum(loss_m2, axis=0) if return_components else loss_m2
+                num_lcs = total_m2.shape[-1]
+                loss_error = (
+                    np.sqrt(np.sum(total_m2) / (num_rounds - 1) / num_rounds) / num_lcs
+                )
+                if loss_error <= target_error:
+                    break
 
-                if return_components:
-                    total_loss += loss.detach().cpu().numpy()
-                else:
-                    total_loss += loss.item()
-                total_count += len(batch_lcs)
+        loss = np.mean(loss_mean, axis=-1)
+
+        if target_error is None:
+            return loss
+        else:
+            return loss, loss_error
+
+    def log_likelihood(self, light_curves, params, batch_size=None):
+        """Evaluate the log-likelihood of light curves for sets of model parameters
 
-        loss = total_loss / total_count
+        This evaluates log p(y | s, c, t0, A, z) for an arbitrary number of candidate
+        parameter vectors for each light curve, as used in the reconstruction term of
+        `~ParsnipModel.loss_function`. The observations are only collated once, and
+        the candidates are evaluated with the decoder in vectorized batches. This can
+        be used as the likelihood for external samplers.
 
-        return loss
+        Parameters
+        ----------
+        light_curves : List[`~astropy.table.Table`] or `~lcdata.Dataset`
+            Light curves to evaluate
+        params : dict
+            Dictionary of parameters to evaluate with the same names and units as the
+            output of `~ParsnipModel.predict_dataset`: 'reference_time', 'color',
+            'amplitude' and 's1', 's2', etc. for each latent variable. A 'redshift' key
+            can optionally be specified to override the redshifts of the light curves.
+            It is required for models that predict the redshift. Each value should
+            have the shape (light curve, candidate), or (light curve,) to evaluate a
+            single candidate for each light curve.
+        batch_size : int, optional
+            Number of (light curve, candidate) combinations to evaluate at once. By
+            default, four times settings['batch_size'].
+
+        Returns
+        -------
+        `~numpy.ndarray`
+            Log-likelihood for each light curve and candidate with shape (light curve,
+            candidate), or (light curve,) if a single candidate was given for each light
+            curve.
+        """
+        light_curves = self._preprocess_light_curves(light_curves)
+
+        if batch_size is None:
+            batch_size = 4 * self.settings['batch_size']
+
+        if self.settings['predict_redshift'] and 'redshift' not in params:
+            raise KeyError("The redshift must be specified for models that predict the "
+                           "redshift.")
+
+        keys = (['reference_time', 'color', 'amplitude']
+                + [f's{idx+1}' for idx in range(self.settings['latent_size'])])
+        if 'redshift' in params:
+            keys.append('redshift')
+
+        # Only drop the candidate axis if none of the parameters have one.
+        single = all(np.ndim(params[k]) <= 1 for k in keys)
+        params = {k: np.atleast_2d(np.asarray(params[k], dtype=float).T).T
+                  for k in keys}
+        num_lcs, num_candidates = np.broadcast(*params.values()).shape
+        params = {k: np.broadcast_to(v, (num_lcs, num_candidates))
+                  for k, v in params.items()}
+
+        if num_lcs != len(light_curves):
+            raise ValueError(f"Got parameters for {num_lcs} light curves, expected "
+                             f"{len(light_curves)}.")
+
+        # Convert the parameters to the units that are used internally.
+        reference_times = np.array(
+            [lc.meta['parsnip_reference_time'] for lc in light_curves]
+        )
+        scales = np.array([lc.meta['parsnip_scale'] for lc in light_curves])
+        params['reference_time'] = time_to_grid(params['reference_time'],
+                                                reference_times[:, None])
+        params['amplitude'] = params['amplitude'] / scales[:, None]
+
+        log_likelihood = np.zeros((num_lcs, num_candidates))
+
+        with torch.no_grad():
+            for lc_start in range(0, num_lcs, self.settings['batch_size']):
+                lc_end = lc_start + self.settings['batch_size']
+                batch_lcs = light_curves[lc_start:lc_end]
+                data = self._get_data(batch_lcs)
+
+                chunk_size = max(1, batch_size // len(batch_lcs))
+
+                for start in range(0, num_candidates, chunk_size):
+                    end = start + chunk_size
+                    chunk_count = min(end, num_candidates) - start
+                    chunk_data = self._repeat_data(data, chunk_count)
+
+                    chunk_params = {
+                        k: torch.FloatTensor(v[lc_start:lc_end, start:end].flatten())
+                        .to(self.device)
+                        for k, v in params.items()
+                    }
+
+                    if 'redshift' in chunk_params:
+                        redshifts = chunk_params['redshift']
+                    else:
+                        redshifts = chunk_data['redshift']
+
+                    encoding = torch.stack(
+                        [chunk_params[f's{idx+1}'] for idx in
+                         range(self.settings['latent_size'])], 1
+                    )
+
+                    nll = self._compute_nll(
+                        chunk_data, redshifts, chunk_params['reference_time'],
+                        chunk_params['color'], encoding, chunk_params['amplitude']
+                    )
+                    log_likelihood[lc_start:lc_end, start:end] = (
+                        -nll.cpu().numpy().reshape((len(batch_lcs), chunk_count))
+                    )
+
+        if single:
+            log_likelihood = log_likelihood[:, 0]
+
+        return log_likelihood
+
+    def _log_posterior(self, data, params):
+        """Evaluate the log-posterior for the parameters used by the posterior sampler
+
+        The parameters are the full encoding vector (with the same layout as the
+        encoding_mu returned by `~ParsnipModel.encode`) followed by the amplitude. We
+        use the same priors as in `~ParsnipModel.loss_function`: a unit normal prior on
+        the encoding, a flat prior on the amplitude and, for models that predict the
+        redshift, priors from the photometric and spectroscopic redshifts.
+        """
+        sample_encoding = params[:, :-1]
+        amplitude = params[:, -1]
+
+        # Convert the encoding to the model parameters.
+        predicted_redshifts, ref_times, color, encoding = \
+            self._parse_encoding(sample_encoding)
+
+        if self.settings['predict_redshift']:
+            use_redshifts = predicted_redshifts
+        else:
+            use_redshifts = data['redshift']
+
+        nll = self._compute_nll(data, use_redshifts, ref_times, color, encoding,
+                                amplitude)
+
+        log_prior = -0.5 * torch.sum(sample_encoding**2, axis=1)
+
+        if self.settings['predict_redshift']:
+            photoz_diff = predicted_redshifts - data['photoz']
+            log_prior = log_prior - 0.5 * photoz_diff**2 / data['photoz_error']**2
+
+            # Only apply the spectroscopic redshift prior where one is available.
+            specz_mask = torch.isnan(data['redshift'])
+            specz = torch.where(specz_mask, predicted_redshifts.detach(),
+                                data['redshift'])
+            specz_diff = predicted_redshifts - specz
+            log_prior = (
+                log_prior - 0.5 * specz_diff**2 / self.settings['specz_error']**2
+            )
 
-    def fit(self, dataset, max_epochs=1000, augment=True, test_dataset=None):
+        return log_prior - nll
+
+    def _sample_posterior_batch(self, light_curves, num_samples, num_chains,
+                                num_warmup, num_steps, step_size, target_accept):
+        """Run the posterior sampler on a batch of preprocessed light curves"""
+        data = self._get_data(light_curves)
+
+        with torch.no_grad():
+            encoding_mu, encoding_logvar = self.encode(data['input_data'])
+            predicted_redshifts, ref_times, color, encoding = self._sample(
+                encoding_mu, encoding_logvar, sample=False
+            )
+            if self.settings['predict_redshift']:
+                use_redshifts = predicted_redshifts
+            else:
+                use_redshifts = data['redshift']
+
+            _, model_flux = self.decode(encoding, ref_times, color,
+                                        data['compare_data'][:, 0], use_redshifts,
+                                        data['band_indices'], return_spectra=False)
+            amplitude_mu, amplitude_logvar = self._compute_amplitude(
+                data['compare_data'][:, 3], model_flux, data['compare_data'][:, 1]
+            )
+
+        # Run every chain for every light curve at the same time.
+        data = self._repeat_data(data, num_chains)
+
+        # We sample in coordinates that are whitened with the variational posterior so
+        # that all of the parameters have roughly unit scale.
+        center = torch.cat([encoding_mu, amplitude_mu[:, None]], 1)
+        scale = torch.exp(0.5 * torch.cat([encoding_logvar,
+                                           amplitude_logvar[:, None]], 1))
+        center = center.repeat_interleave(num_chains, 0)
+        scale = scale.repeat_interleave(num_chains, 0)
+
+        def log_prob_and_grad(z):
+            z = z.detach().requires_grad_(True)
+            log_prob = self._log_posterior(data, center + scale * z)
+            grad, = torch.autograd.grad(log_prob.sum(), z)
+            # Treat any numerical failures as a region of zero probability.
+            log_prob = torch.nan_to_num(log_prob.detach(), nan=-np.inf)
+            return log_prob, torch.nan_to_num(grad, nan=0.)
+
+        # Initialize the chains with draws from the variational posterior.
+        z = torch.randn_like(center)
+        log_prob, grad = log_prob_and_grad(z)
+
+        num_rows = center.shape[0]
+        log_step_size = torch.full((num_rows,), np.log(step_size), device=self.device)
+        samples = torch.zeros((num_samples,) + center.shape, device=self.device)
+        accept_count = torch.zeros(num_rows, device=self.device)
+
+        for iteration in range(num_warmup + num_samples):
+            # Hamiltonian Monte Carlo with a leapfrog integrator. Each chain has its own
+            # step size.
+            eps = torch.exp(log_step_size)[:, None]
+            momentum = torch.randn_like(z)
+            start_energy = -log_prob + 0.5 * torch.sum(momentum**2, axis=1)
+
+            new_z = z
+            new_grad = grad
+            new_momentum = momentum + 0.5 * eps * new_grad
+            for step in range(num_steps):
+                new_z = new_z + eps * new_momentum
+                new_log_prob, new_grad = log_prob_and_grad(new_z)
+                if step < num_steps - 1:
+                    new_momentum = new_momentum + eps * new_grad
+            new_momentum = new_momentum + 0.5 * eps * new_grad
+
+            end_energy = -new_log_prob + 0.5 * torch.sum(new_momentum**2, axis=1)
+            accept_prob = torch.clamp(torch.exp(start_energy - end_energy), max=1.)
+            accept_prob = torch.nan_to_num(accept_prob, nan=0.)
+            accept = torch.rand_like(accept_prob) < accept_prob
+
+            z = torch.where(accept[:, None], new_z, z)
+            log_prob = torch.where(accept, new_log_prob, log_prob)
+            grad = torch.where(accept[:, None], new_grad, grad)
+
+            if iteration < num_warmup:
+                # Adapt the step size of each chain to reach the target acceptance
+                # rate.
+                adapt_rate = 1. / np.sqrt(iteration + 1)
+                log_step_size = (
+                    log_step_size + adapt_rate * (accept_prob - target_accept)
+                )
+            else:
+                samples[iteration - num_warmup] = center + scale * z
+                accept_count += accept
+
+        # Reshape to (light curve, chain, sample, parameter).
+        samples = samples.permute(1, 0, 2).reshape(
+            (len(light_curves), num_chains, num_samples, -1)
+        )
+        accept_rate = (accept_count / max(num_samples, 1)).reshape(
+            (len(light_curves), num_chains)
+        )
+
+        return samples.cpu().numpy(), accept_rate.cpu().numpy()
+
+    def sample_posterior(self, light_curves, num_samples=1000, num_chains=4,
+                         num_warmup=500, num_steps=10, step_size=0.1,
+                         target_accept=0.8, batch_size=None):
+        """Sample from the posterior over the ParSNIP model parameters
+
+        This runs Hamiltonian Monte Carlo with many chains for many light curves at
+        the same time as batched tensor operations. The sampler uses the same
+        Gaussian likelihood and priors as the loss function, and gradients are
+        computed with PyTorch. The chains are initialized with draws from the
+        variational posterior predicted by the encoder, and the parameters are
+        whitened with that posterior. The step size of each chain is adapted during
+        the warmup to reach the target acceptance rate.
+
+        Parameters
+        ----------
+        light_curves : List[`~astropy.table.Table`] or `~lcdata.Dataset`
+            Light curves to sample the posteriors for
+        num_samples : int, optional
+            Number of samples to keep for each chain, by default 1000
+        num_chains : int, optional
+            Number of chains for each light curve, by default 4
+        num_warmup : int, optional
+            Number of warmup iterations for each chain that are discarded, by default
+            500
+        num_steps : int, optional
+            Number of leapfrog steps per iteration, by default 10
+        step_size : float, optional
+            Initial step size, by default 0.1
+        target_accept : float, optional
+            Target acceptance rate, by default 0.8
+        batch_size : int, optional
+            Number of light curves to sample at the same time, by default
+            settings['batch_size']
+
+        Returns
+        -------
+        dict
+            Dictionary with samples for each parameter with shape (light curve,
+            chain, sample). The parameters have the same names and units as the output
+            of `~ParsnipModel.predict_dataset`. The dictionary also contains the
+            acceptance rate of each chain with shape (light curve, chain) under the key
+            'accept_rate'.
+        """
+        light_curves = self._preprocess_light_curves(light_curves)
+
+        if batch_size is None:
+            batch_size = self.settings['batch_size']
+
+        # Sample in evaluation mode, and restore the original mode afterwards.
+        was_training = self.training
+        self.eval()
+
+        all_samples = []
+        all_accept_rates = []
+        try:
+            for start in range(0, len(light_curves), batch_size):
+                samples, accept_rate = self._sample_posterior_batch(
+                    light_curves[start:start + batch_size], num_samples, num_chains,
+                    num_warmup, num_steps, step_size, target_accept
+                )
+                all_samples.append(samples)
+                all_accept_rates.append(accept_rate)
+        finally:
+            self.train(was_training)
+
+        samples = np.concatenate(all_samples)
+        accept_rate = np.concatenate(all_accept_rates)
+
+        # Convert the samples to the same units as predict_dataset.
+        reference_times = np.array(
+            [lc.meta['parsnip_reference_time'] for lc in light_curves]
+        )
+        scales = np.array([lc.meta['parsnip_scale'] for lc in light_curves])
+
+        result = {
+            'reference_time': (
+                reference_times[:, None, None]
+                + samples[..., 0] * self.settings['time_sigma'] / SIDEREAL_SCALE
+            ),
+            'color': samples[..., 1] * self.settings['color_sigma'],
+            'amplitude': samples[..., -1] * scales[:, None, None],
+        }
+
+        for idx in range(self.settings['latent_size']):
+            result[f's{idx+1}'] = samples[..., 2 + idx]
+
+        if self.settings['predict_redshift']:
+            result['predicted_redshift'] = np.clip(np.exp(samples[..., -2] - 1), 0,
+                                                   self.settings['max_redshift'])
+
+        result['accept_rate'] = accept_rate
+
+        return result
+
+    def _time_phase(self, name):
+        """Record the time spent in a phase of a training step
+
+        This does nothing unless telemetry is enabled in `fit`.
+
+        Parameters
+        ----------
+        name : str
+            Name of the phase
+
+        Returns
+        -------
+        context manager
+            Context manager that times the code that it wraps
+        """
+        if self._telemetry is None:
+            return contextlib.nullcontext()
+        return self._telemetry.phase(name)
+
+    def _all_reduce(self, values, op=None):
+        """Reduce a list of values across all processes in a distributed run
+
+        The values are summed unless a different reduction operation is specified.
+        """
+        if op is None:
+            op = dist.ReduceOp.SUM
+        tensor = torch.tensor(values, dtype=torch.float64)
+        dist.all_reduce(tensor, op=op)
+        return tensor.tolist()
+
+    def _broadcast_parameters(self):
+        """Copy the parameters from rank 0 to all other processes in a distributed run
+        """
+        for param in self.parameters():
+            dist.broadcast(param.data, 0)
+
+    def _all_reduce_gradients(self):
+        """Average the gradients across all processes in a distributed run
+
+        The gradients are flattened into a single buffer so that only a single
+        communication is needed.
+        """
+        params = list(self.parameters())
+        grads = [torch.zeros_like(p) if p.grad is None else p.grad for p in params]
+        flat_grads = torch.cat([g.flatten() for g in grads])
+        dist.all_reduce(flat_grads)
+        flat_grads /= dist.get_world_size()
+
+        offset = 0
+        for param in params:
+            numel = param.numel()
+            param.grad = flat_grads[offset:offset + numel].view_as(param).clone()
+            offset += numel
+
+    def fit(self, dataset, max_epochs=1000, augment=True, test_dataset=None,
+            distributed=False, resume=False, telemetry=None):
         """Fit the model to a dataset
 
         Parameters
@@ -1216,38 +2607,144 @@ class ParsnipModel(nn.Module):
             Whether to use augmentation, by default True
         test_dataset : `~lcdata.Dataset`, optional
             Test dataset that will be scored at the end of each epoch, by default None
+        distributed : bool, optional
+            If True, train with data parallelism across multiple processes using
+            `torch.distributed`. The default process group must already be initialized
+            (e.g. with `torch.distributed.init_process_group('gloo')` in a script
+            launched with `torchrun`), and each process should be given its own shard
+            of the dataset and test dataset. The gradients are averaged across
+            processes at every step. Rank 0 handles the learning rate schedule and
+            saves the model. By default False.
+        resume : bool, optional
+            If True and a checkpoint exists at `checkpoint_path`, resume training
+            from the state in that checkpoint. By default False.
+        telemetry : `~FitTelemetry`, str or Callable[[dict], Any], optional
+            If specified, record the time spent in each phase of the training steps,
+            the throughput, the peak memory usage and the number of NaN gradients for
+            every epoch. This can either be a `~FitTelemetry` object, a path to a file
+            to append JSON records to, or a function that will be called with the
+            record for each epoch. See `~FitTelemetry` for details. By default None.
+
+        Notes
+        -----
+        A checkpoint with the full training state is written at the end of every
+        epoch. The checkpoint is written on a background thread so that training can
+        continue while it is being saved.
         """
+        resumed = False
+        if resume:
+            if os.path.exists(self.checkpoint_path):
+                self.load_checkpoint()
+                resumed = True
+
+                # Check whether training had already finished.
+                lr = self.optimizer.param_groups[0]['lr']
+                if lr < self.settings['min_learning_rate']:
+                    return
+
+                # Checkpoints are written at the end of an epoch, so continue with the
+                # next one.
+                self.epoch += 1
+            else:
+                print(f"No checkpoint found at '{self.checkpoint_path}', starting "
+                      "from scratch.")
+
+        if distributed:
+            rank = dist.get_rank()
+
+            if resumed:
+                # The checkpoint holds the random state of rank 0, so every process
+                # restored the same state. Offset the seed by the rank so that the
+                # processes don't draw the same augmentations.
+                seed = (np.random.randint(2**31) + rank) % 2**32
+                np.random.seed(seed)
+                torch.manual_seed(seed)
+
+            # Make sure that all processes start from the same weights.
+            self._broadcast_parameters()
+            dataset_size, = self._all_reduce([len(dataset)])
+        else:
+            rank = 0
+            dataset_size = len(dataset)
+
         # The model is stochastic, so the loss function will have a fair bit of noise.
         # If the dataset is small, we run through several augmentations of it every
         # epoch to get the noise down.
-        repeats = int(np.ceil(25000 / len(dataset)))
+        repeats = int(np.ceil(25000 / dataset_size))
 
         loader = self.get_data_loader(dataset, augment=augment, shuffle=True)
+        num_batches = len(loader)
+
+        if distributed:
+            # Every process needs to run the same number of steps. The shards can
+            # differ slightly in size, so use the smallest number of batches.
+            num_batches = int(self._all_reduce([len(loader)], dist.ReduceOp.MIN)[0])
 
         if test_dataset is not None:
             test_dataset = self.preprocess(test_dataset)
 
+        if telemetry is not None and not isinstance(telemetry, FitTelemetry):
+            telemetry = FitTelemetry(telemetry)
+
+        try:
+            self._telemetry = telemetry
+            self._fit_epochs(loader, num_batches, repeats, max_epochs, test_dataset,
+                             distributed, rank)
+        finally:
+            self._telemetry = None
+
+        self.wait_for_checkpoint()
+
+    def _fit_epochs(self, loader, num_batches, repeats, max_epochs, test_dataset,
+                    distributed, rank):
+        """Run the training loop for `fit`"""
+        telemetry = self._telemetry
+
         while self.epoch < max_epochs:
             self.train()
             train_loss = 0
             train_count = 0
+            test_loss = None
+
+            if telemetry is not None:
+                telemetry.start_epoch(self.epoch, self.device)
 
-            with tqdm(range(len(loader) * repeats), file=sys.stdout) as pbar:
+            with tqdm(range(num_batches * repeats), file=sys.stdout,
+                      disable=rank != 0) as pbar:
                 for repeat in range(repeats):
                     # Training step
-                    for batch_lcs in loader:
-                        self.optimizer.zero_grad()
-                        result = self.forward(batch_lcs)
+                    loader_iter = iter(loader)
+                    for batch_idx in range(num_batches):
+                        if telemetry is not None:
+                            telemetry.start_step()
 
-                        loss = self.loss_function(result)
+                        # The light curves are augmented when they are collated.
+                        with self._time_phase('augment'):
+                            batch_lcs = next(loader_iter)
 
-                        loss.backward()
-                        replace_nan_grads(self.parameters())
+                        self.optimizer.zero_grad()
+                        with self._time_phase('forward'):
+                            result = self.forward(batch_lcs)
+
+                        with self._time_phase('loss'):
+                            loss = self.loss_function(result)
+
+                        with self._time_phase('backward'):
+                            loss.backward()
+                        with self._time_phase('replace_nan_grads'):
+                            nan_count = replace_nan_grads(self.parameters())
+                        if distributed:
+                            with self._time_phase('all_reduce_gradients'):
+                                self._all_reduce_gradients()
                         train_loss += loss.item()
-                        self.optimizer.step()
+                        with self._time_phase('optimizer_step'):
+                            self.optimizer.step()
 
                         train_count += len(batch_lcs)
 
+                        if telemetry is not None:
+                            telemetry.end_step(len(batch_lcs), nan_count)
+
                         total_loss = train_loss / train_count
                         batch_loss = loss.item() / len(batch_lcs)
 
@@ -1258,9 +2755,26 @@ class ParsnipModel(nn.Module):
                         )
                         pbar.update()
 
+                if distributed:
+                    # Combine the losses from all of the processes.
+                    train_loss, train_count = self._all_reduce(
+                        [train_loss, train_count]
+                    )
+                    total_loss = train_loss / train_count
+
                 if test_dataset is not None:
-                    # Calculate the test loss
-                    test_loss = self.score(test_dataset)
+                    # Calculate the test loss. The telemetry only covers the training
+                    # steps, so pause it while scoring.
+                    self._telemetry = None
+                    try:
+                        test_loss = self.score(test_dataset)
+                    finally:
+                        self._telemetry = telemetry
+                    if distributed:
+                        test_sum, test_count = self._all_reduce(
+                            [test_loss * len(test_dataset), len(test_dataset)]
+                        )
+                        test_loss = test_sum / test_count
                     pbar.set_description(
                         f'Epoch {self.epoch:4d}: Loss: {total_loss:8.4f}, '
                         f'Test loss: {test_loss:8.4f}',
@@ -1270,13 +2784,27 @@ class ParsnipModel(nn.Module):
                         f'Epoch {self.epoch:4d}: Loss: {total_loss:8.4f}'
                     )
 
-            self.scheduler.step(train_loss)
+            if rank == 0:
+                self.scheduler.step(train_loss)
 
-            # Checkpoint and save the model
-            self.save()
+                # Checkpoint and save the model
+                self.save_checkpoint(background=True)
+
+            if distributed:
+                # Use the learning rate chosen by rank 0 on all processes.
+                lr = torch.tensor(self.optimizer.param_groups[0]['lr'],
+                                  dtype=torch.float64)
+                dist.broadcast(lr, 0)
+                for param_group in self.optimizer.param_groups:
+                    param_group['lr'] = lr.item()
 
             # Check if the learning rate is below our threshold, and exit if it is.
             lr = self.optimizer.param_groups[0]['lr']
+
+            if telemetry is not None:
+                telemetry.end_epoch(train_loss=train_loss / train_count,
+                                     test_loss=test_loss, learning_rate=lr)
+
             if lr < self.settings['min_learning_rate']:
                 break
 
@@ -1317,157 +2845,192 @@ class ParsnipModel(nn.Module):
         else:
             return predictions
 
-    def predict_dataset(self, dataset, augment=False):
-        """Generate predictions for a dataset
+    def _compute_summary_features(self, result):
+        """Calculate summary features for a batch of light curves
+
+        These are computed on the device that the model outputs are on so that only
+        the summary features need to be transferred back to the host.
 
         Parameters
         ----------
-        dataset : `~lcdata.Dataset`
-            Dataset to generate predictions for.
-        augment : bool, optional
-            Whether to perform augmentation, False by default.
+        result : dict
+            Output of `~ParsnipModel.forward` with to_numpy=False and sample=False.
 
         Returns
         -------
-        predictions : `~astropy.table.Table`
-            astropy Table with one row for each light curve and columns with each of the
-            predicted values.
+        dict
+            Dictionary of `~torch.Tensor` containing the summary features for each
+            light curve.
         """
-        predictions = []
+        time = result['time']
+        obs_flux = result['obs_flux']
+        obs_fluxerr = result['obs_fluxerr']
+        model_flux = result['model_flux']
+        fluxerr_mask = obs_fluxerr == 0
+        obs_fluxerr = torch.where(fluxerr_mask, -1., obs_fluxerr)
+
+        features = {}
+
+        # Signal-to-noise
+        s2n = torch.where(fluxerr_mask, 0., obs_flux / obs_fluxerr)
+        features['total_s2n'] = torch.sqrt(torch.sum(s2n**2, axis=1))
+
+        # Number of observations
+        features['count'] = torch.sum(~fluxerr_mask, axis=1)
+
+        # Number of observations with signal-to-noise above some threshold.
+        features['count_s2n_3'] = torch.sum(s2n > 3, axis=1)
+        features['count_s2n_5'] = torch.sum(s2n > 5, axis=1)
+
+        # Number of observations with signal-to-noise above some threshold in
+        # different time windows.
+        reference_time_offset = (
+            result['encoding_mu'][:, 0] * self.settings['time_sigma'] / SIDEREAL_SCALE
+        )
+        compare_time = reference_time_offset[:, None]
+        mask_pre = time < compare_time - 50.
+        mask_rise = (time >= compare_time - 50.) & (time < compare_time)
+        mask_fall = (time >= compare_time) & (time < compare_time + 50.)
+        mask_post = (time >= compare_time + 50.)
+        mask_s2n = s2n > 3
+        features['count_s2n_3_pre'] = torch.sum(mask_pre & mask_s2n, axis=1)
+        features['count_s2n_3_rise'] = torch.sum(mask_rise & mask_s2n, axis=1)
+        features['count_s2n_3_fall'] = torch.sum(mask_fall & mask_s2n, axis=1)
+        features['count_s2n_3_post'] = torch.sum(mask_post & mask_s2n, axis=1)
+
+        # Chi-square
+        all_chisq = torch.where(
+            fluxerr_mask, 0., (obs_flux - model_flux)**2 / obs_fluxerr**2
+        )
+        features['model_chisq'] = torch.sum(all_chisq, axis=1)
+        features['model_dof'] = (
+            features['count']
+            - 3             # amplitude, color, reference time
+            - self.settings['latent_size']
+        )
 
-        dataset = self.preprocess(dataset, verbose=len(dataset) > 100)
-        loader = self.get_data_loader(dataset, augment=augment)
+        return features
 
-        for batch_lcs in loader:
-            # Run the data through the model.
-            result = self.forward(batch_lcs, to_numpy=True, sample=False)
-
-            # Pull out the reference time and reference scale. Note that if we are
-            # working with an augmented dataset, get_data_loader doesn't construct a
-            # full astropy Table to save time. Handle either case.
-            parsnip_reference_time = []
-            parsnip_scale = []
-            for lc in batch_lcs:
-                if isinstance(lc, astropy.table.Table):
-                    lc_meta = lc.meta
-                else:
-                    lc_data, lc_meta = lc
-                parsnip_reference_time.append(lc_meta['parsnip_reference_time'])
-                parsnip_scale.append(lc_meta['parsnip_scale'])
-            parsnip_reference_time = np.array(parsnip_reference_time)
-            parsnip_scale = np.array(parsnip_scale)
-
-            encoding_mu = result['encoding_mu']
-            encoding_err = np.sqrt(np.exp(result['encoding_logvar']))
-
-            # Update the reference time.
-            reference_time_offset = (
-                encoding_mu[:, 0] * self.settings['time_sigma'] / SIDEREAL_SCALE
-            )
-            reference_time = parsnip_reference_time + reference_time_offset
-            reference_time_error = (
-                encoding_err[:, 0] * self.settings['time_sigma'] / SIDEREAL_SCALE
-            )
+    def _predict_batch(self, result, batch_lcs):
+        """Convert the outputs of the model for a batch of light curves into predictions
 
-            amplitude_mu = result['amplitude_mu'] * parsnip_scale
-            amplitude_error = (
-                np.sqrt(np.exp(result['amplitude_logvar'])) * parsnip_scale
-            )
+        The summary features are calculated on the model's device, and only the
+        per-object values are transferred to the host.
+
+        Parameters
+        ----------
+        result : dict
+            Output of `~ParsnipModel.forward` with to_numpy=False and sample=False.
+        batch_lcs : list
+            Light curves in the batch, as returned by `~ParsnipModel.get_data_loader`.
+
+        Returns
+        -------
+        dict
+            Dictionary containing the predicted values for each light curve.
+        """
+        with torch.no_grad():
+            features = self._compute_summary_features(result)
+        features = {key: value.cpu().numpy() for key, value in features.items()}
+        result = {
+            key: result[key].detach().cpu().numpy() for key in
+            ['encoding_mu', 'encoding_logvar', 'amplitude_mu', 'amplitude_logvar']
+        }
 
-            # Pull out the keys that we care about saving.
-            batch_predictions = {
-                'reference_time': reference_time,
-                'reference_time_error': reference_time_error,
-                'color': encoding_mu[:, 1] * self.settings['color_sigma'],
-                'color_error': encoding_err[:, 1] * self.settings['color_sigma'],
-                'amplitude': amplitude_mu,
-                'amplitude_error': amplitude_error,
-            }
+        # Pull out the reference time and reference scale. Note that if we are
+        # working with an augmented dataset, get_data_loader doesn't construct a
+        # full astropy Table to save time. Handle either case.
+        parsnip_reference_time = []
+        parsnip_scale = []
+        for lc in batch_lcs:
+            if isinstance(lc, astropy.table.Table):
+                lc_meta = lc.meta
+            else:
+                lc_data, lc_meta = lc
+            parsnip_reference_time.append(lc_meta['parsnip_reference_time'])
+            parsnip_scale.append(lc_meta['parsnip_scale'])
+        parsnip_reference_time = np.array(parsnip_reference_time)
+        parsnip_scale = np.array(parsnip_scale)
 
-            for idx in range(self.settings['latent_size']):
-                batch_predictions[f's{idx+1}'] = encoding_mu[:, 2 + idx]
-                batch_predictions[f's{idx+1}_error'] = encoding_err[:, 2 + idx]
+        encoding_mu = result['encoding_mu']
+        encoding_err = np.sqrt(np.exp(result['encoding_logvar']))
 
-            if self.settings['predict_redshift']:
-                pred_redshift = np.clip(
-                    np.exp(encoding_mu[:, -1] - 1),
-                    0, self.settings['max_redshift']
-                )
-                pred_redshift_pos = np.exp(encoding_mu[:, -1] + encoding_err[:, -1] - 1)
-                pred_redshift_neg = np.exp(encoding_mu[:, -1] - encoding_err[:, -1] - 1)
-                pred_redshift_error = (pred_redshift_pos - pred_redshift_neg) / 2.
-                batch_predictions['predicted_redshift'] = pred_redshift
-                batch_predictions['predicted_redshift_error'] = pred_redshift_error
-
-            # Calculate other useful features.
-            time = result['time']
-            obs_flux = result['obs_flux']
-            obs_fluxerr = result['obs_fluxerr']
-            model_flux = result['model_flux']
-            fluxerr_mask = obs_fluxerr == 0
-            obs_fluxerr[fluxerr_mask] = -1.
-
-            # Signal-to-noise
-            s2n = obs_flux / obs_fluxerr
-            s2n[fluxerr_mask] = 0.
-            batch_predictions['total_s2n'] = np.sqrt(np.sum(s2n**2, axis=1))
-
-            # Number of observations
-            batch_predictions['count'] = np.sum(~fluxerr_mask, axis=1)
-
-            # Number of observations with signal-to-noise above some threshold.
-            batch_predictions['count_s2n_3'] = np.sum(s2n > 3, axis=1)
-            batch_predictions['count_s2n_5'] = np.sum(s2n > 5, axis=1)
-
-            # Number of observations with signal-to-noise above some threshold in
-            # different time windows.
-            compare_time = reference_time_offset[:, None]
-            mask_pre = time < compare_time - 50.
-            mask_rise = (time >= compare_time - 50.) & (time < compare_time)
-            mask_fall = (time >= compare_time) & (time < compare_time + 50.)
-            mask_post = (time >= compare_time + 50.)
-            mask_s2n = s2n > 3
-            batch_predictions['count_s2n_3_pre'] = np.sum(mask_pre & mask_s2n, axis=1)
-            batch_predictions['count_s2n_3_rise'] = np.sum(mask_rise & mask_s2n, axis=1)
-            batch_predictions['count_s2n_3_fall'] = np.sum(mask_fall & mask_s2n, axis=1)
-            batch_predictions['count_s2n_3_post'] = np.sum(mask_post & mask_s2n, axis=1)
-
-            # Chi-square
-            all_chisq = (obs_flux - model_flux)**2 / obs_fluxerr**2
-            all_chisq[fluxerr_mask] = 0.
-            batch_predictions['model_chisq'] = np.sum(all_chisq, axis=1)
-            batch_predictions['model_dof'] = (
-                batch_predictions['count']
-                - 3             # amplitude, color, reference time
-                - self.settings['latent_size']
+        # Update the reference time.
+        reference_time_offset = (
+            encoding_mu[:, 0] * self.settings['time_sigma'] / SIDEREAL_SCALE
+        )
+        reference_time = parsnip_reference_time + reference_time_offset
+        reference_time_error = (
+            encoding_err[:, 0] * self.settings['time_sigma'] / SIDEREAL_SCALE
+        )
+
+        amplitude_mu = result['amplitude_mu'] * parsnip_scale
+        amplitude_error = (
+            np.sqrt(np.exp(result['amplitude_logvar'])) * parsnip_scale
+        )
+
+        # Pull out the keys that we care about saving.
+        batch_predictions = {
+            'reference_time': reference_time,
+            'reference_time_error': reference_time_error,
+            'color': encoding_mu[:, 1] * self.settings['color_sigma'],
+            'color_error': encoding_err[:, 1] * self.settings['color_sigma'],
+            'amplitude': amplitude_mu,
+            'amplitude_error': amplitude_error,
+        }
+
+        for idx in range(self.settings['latent_size']):
+            batch_predictions[f's{idx+1}'] = encoding_mu[:, 2 + idx]
+            batch_predictions[f's{idx+1}_error'] = encoding_err[:, 2 + idx]
+
+        if self.settings['predict_redshift']:
+            pred_redshift = np.clip(
+                np.exp(encoding_mu[:, -1] - 1),
+                0, self.settings['max_redshift']
             )
+            pred_redshift_pos = np.exp(encoding_mu[:, -1] + encoding_err[:, -1] - 1)
+            pred_redshift_neg = np.exp(encoding_mu[:, -1] - encoding_err[:, -1] - 1)
+            pred_redshift_error = (pred_redshift_pos - pred_redshift_neg) / 2.
+            batch_predictions['predicted_redshift'] = pred_redshift
+            batch_predictions['predicted_redshift_error'] = pred_redshift_error
 
-            predictions.append(astropy.table.Table(batch_predictions))
+        # Add in the other useful features.
+        batch_predictions.update(features)
 
-        predictions = astropy.table.vstack(predictions, 'exact')
+        return batch_predictions
 
-        # Drop any old predictions from the metadata, and merge it in.
-        meta = dataset.meta.copy()
-        common_columns = set(predictions.colnames) & set(meta.colnames)
-        meta.remove_columns(common_columns)
-        predictions = astropy.table.hstack([meta, predictions], 'exact')
+    def _compute_luminosity(self, amplitudes, amplitude_errors, redshifts):
+        """Estimate the absolute luminosity of a set of light curves
 
-        # Estimate the absolute luminosity.
+        Parameters
+        ----------
+        amplitudes : `~numpy.ndarray`
+            Amplitude of each light curve
+        amplitude_errors : `~numpy.ndarray`
+            Uncertainty on the amplitude of each light curve
+        redshifts : `~numpy.ndarray`
+            Redshift of each light curve
+
+        Returns
+        -------
+        luminosity : `~numpy.ndarray`
+            Absolute luminosity of each light curve, or NaN if it can't be estimated.
+        luminosity_error : `~numpy.ndarray`
+            Uncertainty on the absolute luminosity of each light curve
+        """
         # Figure out which light curves we can calculate the luminosity for.
-        amplitudes = predictions['amplitude'].copy()
+        amplitudes = np.array(amplitudes)
+        amplitude_errors = np.asarray(amplitude_errors)
+        redshifts = np.array(redshifts)
         amplitude_mask = amplitudes > 0.
-        if self.settings['predict_redshift']:
-            redshifts = predictions['predicted_redshift'].copy()
-        else:
-            redshifts = predictions['redshift'].copy()
         redshift_mask = redshifts > 0.
-        amplitude_error_mask = predictions['amplitude_error'] < 0.5 * amplitudes
+        amplitude_error_mask = amplitude_errors < 0.5 * amplitudes
         luminosity_mask = amplitude_mask & redshift_mask & amplitude_error_mask
 
         # Mask out invalid data for luminosities
         redshifts[~luminosity_mask] = 1.
         amplitudes[~luminosity_mask] = 1.
-        frac_diff = predictions['amplitude_error'] / amplitudes
+        frac_diff = amplitude_errors / amplitudes
         frac_diff[~luminosity_mask] = 0.5
 
         luminosity = (
@@ -1476,25 +3039,108 @@ class ParsnipModel(nn.Module):
             - Planck18.distmod(redshifts).value
         )
         luminosity[~luminosity_mask] = np.nan
-        predictions['luminosity'] = luminosity
 
         # Luminosity uncertainty
-        int_mag_err = frac_to_mag(frac_diff)
-        int_mag_err[~luminosity_mask] = np.nan
-        predictions['luminosity_error'] = int_mag_err
+        luminosity_error = frac_to_mag(frac_diff)
+        luminosity_error[~luminosity_mask] = np.nan
+
+        return luminosity, luminosity_error
+
+    def predict_dataset(self, dataset, augment=False):
+        """Generate predictions for a dataset
 
-        # Remove the processing flag.
-        del predictions['parsnip_preprocessed']
+        Parameters
+        ----------
+        dataset : `~lcdata.Dataset`
+            Dataset to generate predictions for.
+        augment : bool, optional
+            Whether to perform augmentation, False by default.
+
+        Returns
+        -------
+        predictions : `~astropy.table.Table`
+            astropy Table with one row for each light curve and columns with each of the
+            predicted values.
+        """
+        dataset = self.preprocess(dataset, verbose=len(dataset) > 100)
+        loader = self.get_data_loader(dataset, augment=augment)
+
+        # Write the predictions for each batch directly into columns that are sized for
+        # the full dataset. These are allocated once we know what keys and dtypes the
+        # predictions have.
+        columns = None
+        start = 0
+
+        for batch_lcs in loader:
+            # Run the data through the model.
+            with torch.no_grad():
+                result = self.forward(batch_lcs, sample=False, return_spectra=False)
+            batch_predictions = self._predict_batch(result, batch_lcs)
+
+            if columns is None:
+                columns = {key: np.empty(len(dataset), dtype=np.asarray(value).dtype)
+                           for key, value in batch_predictions.items()}
+
+            end = start + len(batch_lcs)
+            for key, value in batch_predictions.items():
+                columns[key][start:end] = value
+            start = end
+
+        # Estimate the absolute luminosity.
+        if self.settings['predict_redshift']:
+            redshifts = columns['predicted_redshift']
+        else:
+            redshifts = dataset.meta['redshift']
+        columns['luminosity'], columns['luminosity_error'] = self._compute_luminosity(
+            columns['amplitude'], columns['amplitude_error'], redshifts
+        )
+
+        return self._build_prediction_table(dataset.meta, columns)
+
+    def _build_prediction_table(self, meta, columns, copy_meta=True):
+        """Combine the metadata for a dataset with a set of predictions
+
+        Any old predictions in the metadata are dropped, along with the flag that we
+        use to mark preprocessed light curves. The table is built in a single step
+        without copying the prediction columns.
+
+        Parameters
+        ----------
+        meta : `~astropy.table.Table`
+            Metadata for the dataset
+        columns : dict[str, `~numpy.ndarray`]
+            Predicted values for each light curve in the dataset
+        copy_meta : bool, optional
+            Whether to copy the metadata columns, by default True. This can be
+            disabled if the metadata table was created only for this output.
+
+        Returns
+        -------
+        `~astropy.table.Table`
+            astropy Table with one row for each light curve containing the metadata
+            and the predictions.
+        """
+        meta_columns = [meta[name].copy() if copy_meta else meta[name]
+                        for name in meta.colnames
+                        if name not in columns and name != 'parsnip_preprocessed']
+        prediction_columns = [astropy.table.Column(value, name=key, copy=False)
+                              for key, value in columns.items()]
+
+        predictions = astropy.table.Table(meta_columns + prediction_columns,
+                                          meta=meta.meta.copy(), copy=False)
 
         return predictions
 
     def predict_dataset_augmented(self, dataset, augments=10):
         """Generate predictions for a dataset with augmentation
 
-        This will first generate predictions for the dataset without augmentation,
-        and will then generate predictions for the dataset with augmentation the
-        given number of times. This returns a dataframe in the same format as
-        `~predict_dataset`, but with the following additional columns:
+        This will generate predictions for the dataset without augmentation, and for
+        the dataset with augmentation the given number of times. Each light curve is
+        evaluated in the same batch as all of its augmentations, so the dataset only
+        needs to be processed once. This returns a dataframe in the same format as
+        `~predict_dataset` with the predictions for the original light curves followed
+        by the predictions for each pass of augmentation, along with the following
+        additional columns:
         - original_object_id: the original object_id for each augmentation.
         - augmented: True for augmented light curves, False for original ones.
 
@@ -1511,25 +3157,73 @@ class ParsnipModel(nn.Module):
             astropy Table with one row for each light curve and columns with each of the
             predicted values.
         """
-        # First pass without augmentation.
-        pred = self.predict_dataset(dataset)
-        pred['original_object_id'] = pred['object_id']
-        pred['augmented'] = False
-
-        predictions = [pred]
-
-        # Next passes with augmentation.
-        for idx in tqdm(range(augments), file=sys.stdout):
-            pred = self.predict_dataset(dataset, augment=True)
-            pred['original_object_id'] = pred['object_id']
-            pred['augmented'] = True
-            pred['object_id'] = [i + f'_aug_{idx+1}' for i in pred['object_id']]
-            predictions.append(pred)
-
-        predictions = astropy.table.vstack(predictions, 'exact')
-        return predictions
+        dataset = self.preprocess(dataset, verbose=len(dataset) > 100)
+        light_curves = dataset.light_curves
+        num_lcs = len(light_curves)
+        num_variants = augments + 1
+
+        # Reset the metadata caches that we use to speed up augmenting.
+        for lc in light_curves:
+            lc.meta.copy(update_cache=True)
+
+        # We evaluate each light curve together with all of its augmentations in a
+        # single batch. Choose the number of light curves in each batch so that the
+        # total batch size matches the one used for training.
+        chunk_size = max(1, self.settings['batch_size'] // num_variants)
+
+        # The output contains the original light curves followed by each pass of
+        # augmentations. We write the predictions directly into that layout.
+        columns = None
+
+        for start in tqdm(range(0, num_lcs, chunk_size), file=sys.stdout):
+            chunk_lcs = light_curves[start:start + chunk_size]
+            end = start + len(chunk_lcs)
+
+            batch_lcs = list(chunk_lcs)
+            for idx in range(augments):
+                batch_lcs.extend(self.augment_light_curves(chunk_lcs, as_table=False))
+
+            with torch.no_grad():
+                result = self.forward(batch_lcs, sample=False, return_spectra=False)
+            batch_predictions = self._predict_batch(result, batch_lcs)
+
+            if columns is None:
+                columns = {
+                    key: np.empty(num_variants * num_lcs,
+                                  dtype=np.asarray(value).dtype)
+                    for key, value in batch_predictions.items()
+                }
+
+            for key, value in batch_predictions.items():
+                columns[key].reshape(num_variants, num_lcs)[:, start:end] = \
+                    np.reshape(value, (num_variants, end - start))
+
+        # Repeat the metadata for each pass, and label the augmented light curves.
+        indices = np.tile(np.arange(num_lcs), num_variants)
+        meta = dataset.meta[indices]
+
+        original_object_id = np.asarray(dataset.meta['object_id'])[indices]
+        suffixes = np.repeat(
+            [''] + [f'_aug_{idx+1}' for idx in range(augments)], num_lcs
+        )
+        meta['object_id'] = np.char.add(original_object_id, suffixes)
+
+        # Estimate the absolute luminosity.
+        if self.settings['predict_redshift']:
+            redshifts = columns['predicted_redshift']
+        else:
+            redshifts = meta['redshift']
+        columns['luminosity'], columns['luminosity_error'] = self._compute_luminosity(
+            columns['amplitude'], columns['amplitude_error'], redshifts
+        )
+
+        columns['original_object_id'] = original_object_id
+        columns['augmented'] = np.repeat(np.arange(num_variants) > 0, num_lcs)
+
+        return self._build_prediction_table(meta, columns, copy_meta=False)
 
-    def _predict_time_series(self, light_curve, pred_times, pred_bands, sample, count):
+    def _predict_time_series(self, light_curve, pred_times, pred_bands, sample, count,
+                             return_spectra=True):
         # Preprocess the light curve if it wasn't already.
         light_curve = preprocess_light_curve(light_curve, self.settings)
 
@@ -1542,47 +3236,174 @@ class ParsnipModel(nn.Module):
 
         if count is not None:
             # Predict multiple light curves
-            light_curves = [light_curve] * count
             grid_times = grid_times.repeat(count, 1)
             pred_bands = pred_bands.repeat(count, 1)
-        else:
-            light_curves = [light_curve]
 
-        # Sample VAE parameters
-        result = self.forward(light_curves, sample)
+        with torch.no_grad():
+            # Sample VAE parameters. The light curve is only encoded once, and all of
+            # the samples are drawn from that encoding. The result is returned to the
+            # caller, so it keeps the model spectra at the observed times. These are
+            # small compared to the predictions on the grid below.
+            result = self.forward([light_curve], sample, count=count)
 
-        # Do the predictions
-        if self.settings['predict_redshift']:
-            redshifts = result['predicted_redshift']
-        else:
-            redshifts = result['redshift']
-
-        model_spectra, model_flux = self.decode(
-            result['encoding'],
-            result['ref_times'],
-            result['color'],
-            grid_times,
-            redshifts,
-            pred_bands,
-            result['amplitude'],
-        )
+            # Do the predictions
+            if self.settings['predict_redshift']:
+                redshifts = result['predicted_redshift']
+            else:
+                redshifts = result['redshift']
+
+            model_spectra, model_flux = self.decode(
+                result['encoding'],
+                result['ref_times'],
+                result['color'],
+                grid_times,
+                redshifts,
+                pred_bands,
+                result['amplitude'],
+                return_spectra=return_spectra,
+            )
 
         model_flux = model_flux.cpu().detach().numpy()
-        model_spectra = model_spectra.cpu().detach().numpy()
+        if return_spectra:
+            model_spectra = model_spectra.cpu().detach().numpy()
 
         if count is None:
             # Get rid of the batch index
             model_flux = model_flux[0]
-            model_spectra = model_spectra[0]
+            if return_spectra:
+                model_spectra = model_spectra[0]
 
         cpu_result = {k: v.detach().cpu().numpy() for k, v in result.items()}
 
         # Scale everything to the original light curve scale.
         model_flux *= light_curve.meta['parsnip_scale']
-        model_spectra *= light_curve.meta['parsnip_scale']
+        if return_spectra:
+            model_spectra *= light_curve.meta['parsnip_scale']
 
         return model_flux, model_spectra, cpu_result
 
+    def _preprocess_light_curves(self, light_curves):
+        """Preprocess a list of light curves or an lcdata Dataset
+
+        Unlike `~ParsnipModel.preprocess`, this raises an exception for invalid light
+        curves rather than dropping them so that the outputs line up with the inputs.
+        """
+        if isinstance(light_curves, lcdata.Dataset):
+            light_curves = light_curves.light_curves
+
+        return [preprocess_light_curve(lc, self.settings) for lc in light_curves]
+
+    def _predict_time_series_batch(self, light_curves, pred_times, pred_bands, sample,
+                                   return_spectra=False):
+        """Predict the time series for a set of preprocessed light curves
+
+        The light curves are encoded and decoded in batches of size
+        settings['batch_size']. Each light curve can have a different number of
+        prediction times. The outputs are padded to the largest number of prediction
+        times with NaNs.
+
+        Parameters
+        ----------
+        light_curves : List[`~astropy.table.Table`]
+            Preprocessed light curves
+        pred_times : List[`~numpy.ndarray`]
+            Times to predict each light curve at
+        pred_bands : List[`~numpy.ndarray`]
+            Band indices to predict each light curve in
+        sample : bool
+            If True, sample from the latent variable posteriors. Otherwise, use the MAP.
+        return_spectra : bool, optional
+            Whether to return the model spectra, by default False.
+
+        Returns
+        -------
+        `~numpy.ndarray`
+            Model flux with shape (light curve, time)
+        `~numpy.ndarray`
+            Model spectra with shape (light curve, wavelength, time). None unless
+            return_spectra is True.
+
+        Raises
+        ------
+        ValueError
+            If no light curves are given
+        """
+        if len(light_curves) == 0:
+            raise ValueError("Can't predict the time series of an empty list of light "
+                             "curves.")
+
+        max_count = max([len(i) for i in pred_times])
+        num_lcs = len(light_curves)
+
+        all_model_flux = np.full((num_lcs, max_count), np.nan, dtype=np.float32)
+        if return_spectra:
+            all_model_spectra = np.full(
+                (num_lcs, self.settings['spectrum_bins'], max_count), np.nan,
+                dtype=np.float32
+            )
+        else:
+            all_model_spectra = None
+
+        batch_size = self.settings['batch_size']
+
+        with torch.no_grad():
+            for start in range(0, num_lcs, batch_size):
+                batch_lcs = light_curves[start:start + batch_size]
+                batch_times = pred_times[start:start + batch_size]
+                batch_bands = pred_bands[start:start + batch_size]
+
+                # Sample VAE parameters
+                result = self.forward(batch_lcs, sample, return_spectra=False)
+
+                if self.settings['predict_redshift']:
+                    redshifts = result['predicted_redshift']
+                else:
+                    redshifts = result['redshift']
+
+                # Convert the given times to our internal times and pad everything to
+                # the same length.
+                grid_times = nn.utils.rnn.pad_sequence([
+                    torch.FloatTensor(time_to_grid(
+                        np.asarray(times, dtype=float),
+                        lc.meta['parsnip_reference_time']
+                    ))
+                    for lc, times in zip(batch_lcs, batch_times)
+                ], batch_first=True).to(self.device)
+                grid_bands = nn.utils.rnn.pad_sequence([
+                    torch.LongTensor(np.asarray(bands)) for bands in batch_bands
+                ], batch_first=True).to(self.device)
+
+                model_spectra, model_flux = self.decode(
+                    result['encoding'],
+                    result['ref_times'],
+                    result['color'],
+                    grid_times,
+                    redshifts,
+                    grid_bands,
+                    result['amplitude'],
+                    return_spectra=return_spectra,
+                )
+
+                # Scale everything to the original light curve scale.
+                scales = torch.FloatTensor(
+                    [lc.meta['parsnip_scale'] for lc in batch_lcs]
+                ).to(self.device)
+                model_flux = (model_flux * scales[:, None]).cpu().numpy()
+                if return_spectra:
+                    model_spectra = (
+                        (model_spectra * scales[:, None, None]).cpu().numpy()
+                    )
+
+                for idx, times in enumerate(batch_times):
+                    lc_idx = start + idx
+                    lc_count = len(times)
+                    all_model_flux[lc_idx, :lc_count] = model_flux[idx, :lc_count]
+                    if return_spectra:
+                        all_model_spectra[lc_idx, :, :lc_count] = \
+                            model_spectra[idx, :, :lc_count]
+
+        return all_model_flux, all_model_spectra
+
     def predict_light_curve(self, light_curve, sample=False, count=None, sampling=1.,
                             pad=50.):
         """Predict the flux of a light curve on a grid
@@ -1622,7 +3443,7 @@ class ParsnipModel(nn.Module):
         pred_bands = np.repeat(band_indices, len(model_times))
 
         model_flux, model_spectra, model_result = self._predict_time_series(
-            light_curve, pred_times, pred_bands, sample, count
+            light_curve, pred_times, pred_bands, sample, count, return_spectra=False
         )
 
         # Reshape model_flux so that it has the shape (batch, band, time)
@@ -1634,6 +3455,91 @@ class ParsnipModel(nn.Module):
 
         return model_times, model_flux, model_result
 
+    def predict_light_curves(self, light_curves, sample=False, sampling=1., pad=50.,
+                             times=None, path=None):
+        """Predict the flux of a set of light curves on a grid
+
+        This is a batched version of `~ParsnipModel.predict_light_curve` that can be
+        used to generate model light curves for a large number of objects at once.
+
+        Parameters
+        ----------
+        light_curves : List[`~astropy.table.Table`] or `~lcdata.Dataset`
+            Light curves to predict
+        sample : bool, optional
+            If True, sample from the latent variable posteriors. Otherwise,
+            use the MAP. By default False.
+        sampling : int, optional
+            Grid sampling in days, by default 1.
+        pad : int, optional
+            Number of days before and after the light curve observations to predict the
+            light curve at, by default 50.
+        times : List[`~numpy.ndarray`], optional
+            Times to predict each light curve at. If specified, this overrides the grid
+            specified by `sampling` and `pad`.
+        path : str, optional
+            If specified, the predictions are also written to an HDF5 file at this path
+            as an astropy Table with one row per light curve.
+
+        Returns
+        -------
+        `~numpy.ndarray`
+            Times that each light curve was sampled at, with shape (light curve, time)
+        `~numpy.ndarray`
+            Flux of the model in each band with shape (light curve, band, time)
+
+        The outputs are padded with NaNs for light curves that were sampled at fewer
+        times than others.
+
+        Raises
+        ------
+        ValueError
+            If no light curves are given
+        """
+        light_curves = self._preprocess_light_curves(light_curves)
+
+        # Figure out where to sample each light curve
+        if times is None:
+            times = []
+            for lc in light_curves:
+                min_time = np.min(lc['time']) - pad
+                max_time = np.max(lc['time']) + pad
+                times.append(np.arange(min_time, max_time + sampling, sampling))
+
+        band_indices = np.arange(len(self.settings['bands']))
+
+        pred_times = [np.tile(i, len(band_indices)) for i in times]
+        pred_bands = [np.repeat(band_indices, len(i)) for i in times]
+
+        model_flux, _ = self._predict_time_series_batch(
+            light_curves, pred_times, pred_bands, sample
+        )
+
+        # Reshape model_flux so that it has the shape (light curve, band, time).
+        max_count = max([len(i) for i in times])
+        model_times = np.full((len(light_curves), max_count), np.nan)
+        reshaped_flux = np.full((len(light_curves), len(band_indices), max_count),
+                                np.nan, dtype=np.float32)
+        for idx, lc_times in enumerate(times):
+            lc_count = len(lc_times)
+            model_times[idx, :lc_count] = lc_times
+            reshaped_flux[idx, :, :lc_count] = (
+                model_flux[idx, :lc_count * len(band_indices)]
+                .reshape((len(band_indices), lc_count))
+            )
+
+        if path is not None:
+            table = astropy.table.Table({
+                'object_id': [lc.meta['object_id'] for lc in light_curves],
+                'time': model_times,
+                'flux': reshaped_flux,
+            })
+            table.meta['bands'] = list(self.settings['bands'])
+            table.write(path, overwrite=True, serialize_meta=True,
+                        path='/light_curves')
+
+        return model_times, reshaped_flux
+
     def predict_spectrum(self, light_curve, time, sample=False, count=None):
         """Predict the spectrum of a light curve at a given time
 
@@ -1664,20 +3570,88 @@ class ParsnipModel(nn.Module):
 
         return model_spectra[..., 0]
 
-    def predict_sncosmo(self, light_curve, sample=False):
-        """Package the predictions for a light curve as an sncosmo model
+    def predict_spectra(self, light_curves, times, sample=False, path=None):
+        """Predict the spectra of a set of light curves
 
-        This method performs variational inference on a light curve to predict its
-        latent representation. It then initializes an SNCosmo model with that
-        representation.
+        This is a batched version of `~ParsnipModel.predict_spectrum`.
 
         Parameters
         ----------
-        light_curve : `~astropy.table.Table`
-            Light curve
+        light_curves : List[`~astropy.table.Table`] or `~lcdata.Dataset`
+            Light curves
+        times : float or List
+            Times to predict the spectra at. This can either be a single time that is
+            used for all of the light curves, or a list with an entry for each light
+            curve. Each entry can either be a single time or a list of times.
         sample : bool, optional
             If True, sample from the latent variable posteriors. Otherwise,
             use the MAP. By default False.
+        path : str, optional
+            If specified, the predictions are also written to an HDF5 file at this path
+            as an astropy Table with one row per light curve.
+
+        Returns
+        -------
+        `~numpy.ndarray`
+            Predicted spectra at the wavelengths specified by
+            `~ParsnipModel.model_wave`. If a single time was given for each light curve,
+            this has the shape (light curve, wavelength). Otherwise, it has the shape
+            (light curve, time, wavelength) and is padded with NaNs for light curves
+            with fewer times than others.
+
+        Raises
+        ------
+        ValueError
+            If no light curves are given
+        """
+        light_curves = self._preprocess_light_curves(light_curves)
+
+        if np.isscalar(times):
+            times = [times] * len(light_curves)
+
+        single_time = all([np.isscalar(i) for i in times])
+        pred_times = [np.atleast_1d(i) for i in times]
+        pred_bands = [np.zeros(len(i), dtype=int) for i in pred_times]
+
+        _, model_spectra = self._predict_time_series_batch(
+            light_curves, pred_times, pred_bands, sample, return_spectra=True
+        )
+
+        # Reorder the axes to (light curve, time, wavelength)
+        model_spectra = model_spectra.transpose(0, 2, 1)
+
+        if single_time:
+            model_spectra = model_spectra[:, 0]
+
+        if path is not None:
+            max_count = max([len(i) for i in pred_times])
+            table_times = np.full((len(light_curves), max_count), np.nan)
+            for idx, lc_times in enumerate(pred_times):
+                table_times[idx, :len(lc_times)] = lc_times
+            if single_time:
+                table_times = table_times[:, 0]
+
+            table = astropy.table.Table({
+                'object_id': [lc.meta['object_id'] for lc in light_curves],
+                'time': table_times,
+                'flux': model_spectra,
+            })
+            table.meta['wave'] = list(self.model_wave)
+            table.write(path, overwrite=True, serialize_meta=True, path='/spectra')
+
+        return model_spectra
+
+    def _build_sncosmo_model(self, light_curve, result, idx=0):
+        """Build an sncosmo model from the output of `~ParsnipModel.forward`
+
+        Parameters
+        ----------
+        light_curve : `~astropy.table.Table`
+            Preprocessed light curve
+        result : dict
+            Output of `~ParsnipModel.forward` with to_numpy=True
+        idx : int, optional
+            Index of the light curve in the result, by default 0
 
         Returns
         -------
@@ -1685,37 +3659,218 @@ class ParsnipModel(nn.Module):
             SNCosmo model initialized with the light curve's predicted latent
             representation
         """
-        light_curve = preprocess_light_curve(light_curve, self.settings)
-
-        # Run through the model to predict parameters.
-        result = self.forward([light_curve], sample=sample, to_numpy=True)
-
-        # Build the sncosmo model.
         model = sncosmo.Model(source=ParsnipSncosmoSource(self))
 
         meta = light_curve.meta
         if self.settings['predict_redshift']:
-            model['z'] = result['predicted_redshift'][0]
+            model['z'] = result['predicted_redshift'][idx]
         else:
             model['z'] = meta['redshift']
 
-        model['t0'] = grid_to_time(result['ref_times'][0],
+        model['t0'] = grid_to_time(result['ref_times'][idx],
                                    meta['parsnip_reference_time'])
-        model['color'] = result['color'][0]
+        model['color'] = result['color'][idx]
 
         # Note: ZP of amplitude is 25, and we use an internal offset of 20 for building
         # the model so that things are close to 1. Combined, that means that we need to
         # apply an offset of 45 mag when calculating the amplitude for sncosmo.
         model['amplitude'] = (
-            light_curve.meta['parsnip_scale'] * result['amplitude'][0]
+            meta['parsnip_scale'] * result['amplitude'][idx]
             * 10**(-0.4 * (20 + self.settings['zeropoint']))
         )
 
         for i in range(self.settings['latent_size']):
-            model[f's{i+1}'] = result['encoding'][0, i]
+            model[f's{i+1}'] = result['encoding'][idx, i]
 
         return model
 
+    def predict_sncosmo(self, light_curve, sample=False):
+        """Package the predictions for a light curve as an sncosmo model
+
+        This method performs variational inference on a light curve to predict its
+        latent representation. It then initializes an SNCosmo model with that
+        representation.
+
+        Parameters
+        ----------
+        light_curve : `~astropy.table.Table`
+            Light curve
+        sample : bool, optional
+            If True, sample from the latent variable posteriors. Otherwise,
+            use the MAP. By default False.
+
+        Returns
+        -------
+        `~ParsnipSncosmoModel`
+            SNCosmo model initialized with the light curve's predicted latent
+            representation
+        """
+        light_curve = preprocess_light_curve(light_curve, self.settings)
+
+        # Run through the model to predict parameters.
+        result = self.forward([light_curve], sample=sample, to_numpy=True,
+                              return_spectra=False)
+
+        # Build the sncosmo model.
+        return self._build_sncosmo_model(light_curve, result)
+
+    def predict_sncosmo_models(self, light_curves, sample=False):
+        """Package the predictions for a set of light curves as sncosmo models
+
+        This is a batched version of `~ParsnipModel.predict_sncosmo`. The light curves
+        are run through the model in batches of size settings['batch_size'].
+
+        Parameters
+        ----------
+        light_curves : List[`~astropy.table.Table`] or `~lcdata.Dataset`
+            Light curves
+        sample : bool, optional
+            If True, sample from the latent variable posteriors. Otherwise,
+            use the MAP. By default False.
+
+        Returns
+        -------
+        List[`~ParsnipSncosmoModel`]
+            SNCosmo models initialized with each light curve's predicted latent
+            representation
+        """
+        light_curves = self._preprocess_light_curves(light_curves)
+        batch_size = self.settings['batch_size']
+
+        models = []
+        with torch.no_grad():
+            for start in range(0, len(light_curves), batch_size):
+                batch_lcs = light_curves[start:start + batch_size]
+                result = self.forward(batch_lcs, sample=sample, to_numpy=True,
+                                      return_spectra=False)
+                for idx, lc in enumerate(batch_lcs):
+                    models.append(self._build_sncosmo_model(lc, result, idx))
+
+        return models
+
+    def fit_sncosmo(self, light_curve, maxiter=1000):
+        """Fit a light curve with the ParSNIP model as an sncosmo-style model
+
+        This performs a maximum likelihood fit of the amplitude, color, reference time
+        and intrinsic latent variables of the ParSNIP model to a light curve with the
+        redshift held fixed. This is equivalent to fitting the model returned by
+        `~ParsnipModel.predict_sncosmo` with `sncosmo.fit_lc`, but the gradients of the
+        chi-square with respect to all of the parameters are computed exactly with
+        PyTorch rather than with finite differences, so far fewer model evaluations are
+        needed. The fit is initialized at the MAP of the variational posterior.
+
+        Parameters
+        ----------
+        light_curve : `~astropy.table.Table`
+            Light curve to fit
+        maxiter : int, optional
+            Maximum number of iterations of the optimizer, by default 1000
+
+        Returns
+        -------
+        `~sncosmo.utils.Result`
+            Result of the fit in the same format as `sncosmo.fit_lc`. The covariance
+            is estimated from the exact Hessian of the chi-square at the best-fit
+            parameters.
+        `~ParsnipSncosmoModel`
+            SNCosmo model initialized with the best-fit parameters
+        """
+        light_curve = preprocess_light_curve(light_curve, self.settings)
+        data = self._get_data([light_curve])
+
+        time = data['compare_data'][:, 0]
+        obs_flux = data['compare_data'][:, 1]
+        obs_fluxerr = data['compare_data'][:, 2]
+        band_indices = data['band_indices']
+
+        # Initialize at the MAP of the variational posterior.
+        with torch.no_grad():
+            encoding_mu, encoding_logvar = self.encode(data['input_data'])
+            predicted_redshift, ref_times, color, encoding = self._sample(
+                encoding_mu, encoding_logvar, sample=False
+            )
+            if self.settings['predict_redshift']:
+                redshift = predicted_redshift
+            else:
+                redshift = data['redshift']
+
+            _, model_flux = self.decode(encoding, ref_times, color, time, redshift,
+                                        band_indices, return_spectra=False)
+            amplitude, _ = self._compute_amplitude(1 / obs_fluxerr**2, model_flux,
+                                                   obs_flux)
+
+        # Parameter vector: reference time, amplitude, color, latent variables.
+        x0 = torch.cat([ref_times, amplitude, color, encoding[0]]).cpu().numpy()
+
+        def chisq_function(params):
+            model_flux = self.decode(
+                params[3:][None, :], params[0:1], params[2:3], time, redshift,
+                band_indices, params[1:2], return_spectra=False
+            )[1]
+            return torch.sum((obs_flux - model_flux)**2 / obs_fluxerr**2)
+
+        def objective(x):
+            params = torch.tensor(x, dtype=torch.float32, device=self.device,
+                                  requires_grad=True)
+            chisq = chisq_function(params)
+            grad, = torch.autograd.grad(chisq, params)
+            return chisq.item(), grad.cpu().numpy().astype(np.float64)
+
+        fit_result = scipy.optimize.minimize(
+            objective, x0.astype(np.float64), jac=True, method='L-BFGS-B',
+            options={'maxiter': maxiter}
+        )
+
+        # Estimate the covariance from the exact Hessian of the chi-square.
+        best_params = torch.tensor(fit_result.x, dtype=torch.float32,
+                                   device=self.device)
+        hessian = torch.autograd.functional.hessian(chisq_function, best_params)
+        hessian = hessian.cpu().numpy().astype(np.float64)
+        try:
+            covariance = 2 * np.linalg.inv(hessian)
+        except np.linalg.LinAlgError:
+            covariance = None
+
+        # Convert everything to the units used by sncosmo.
+        best_result = {
+            'predicted_redshift': redshift.detach().cpu().numpy(),
+            'ref_times': fit_result.x[0:1],
+            'amplitude': fit_result.x[1:2],
+            'color': fit_result.x[2:3],
+            'encoding': fit_result.x[None, 3:],
+        }
+        model = self._build_sncosmo_model(light_curve, best_result)
+
+        vparam_names = (
+            ['t0', 'amplitude', 'color']
+            + [f's{i+1}' for i in range(self.settings['latent_size'])]
+        )
+        if covariance is not None:
+            unit_scales = np.ones(len(vparam_names))
+            unit_scales[0] = 1 / SIDEREAL_SCALE
+            unit_scales[1] = (light_curve.meta['parsnip_scale']
+                              * 10**(-0.4 * (20 + self.settings['zeropoint'])))
+            covariance = covariance * unit_scales[:, None] * unit_scales[None, :]
+            errors = OrderedDict(zip(vparam_names, np.sqrt(np.diag(covariance))))
+        else:
+            errors = OrderedDict((i, np.nan) for i in vparam_names)
+
+        result = sncosmo.utils.Result(
+            success=fit_result.success,
+            message=str(fit_result.message),
+            ncall=fit_result.nfev,
+            chisq=fit_result.fun,
+            ndof=time.shape[1] - len(vparam_names),
+            param_names=model.param_names,
+            parameters=model.parameters.copy(),
+            vparam_names=vparam_names,
+            covariance=covariance,
+            errors=errors,
+            nfit=1,
+        )
+
+        return result, model
+
     def predict_redshift_distribution(self, light_curve, min_redshift=0.,
                                       max_redshift=None, sampling=0.01):
         """Predict the redshift distribution for a light curve.
@@ -1760,6 +3915,158 @@ class ParsnipModel(nn.Module):
         `~numpy.ndarray`
             Redshift probability distribution
         """
+        sample_redshifts, prob = self.predict_redshift_distributions(
+            [light_curve],
+            min_redshift=min_redshift,
+            max_redshift=max_redshift,
+            sampling=sampling,
+        )
+
+        return sample_redshifts, prob[0]
+
+    def predict_redshift(self, light_curve, min_redshift=0., max_redshift=None,
+                         sampling=0.01):
+        """Predict the redshift of a light curve.
+
+        This evaluates the MAP estimate of the redshift.
+
+        Parameters
+        ----------
+        light_curve : `~astropy.table.Table`
+            Light curve
+
+        Returns
+        -------
+        float
+            MAP estimate of the redshift
+        """
+        redshifts, redshift_distribution = self.predict_redshift_distribution(
+            light_curve,
+            min_redshift=min_redshift,
+            max_redshift=max_redshift,
+            sampling=sampling
+        )
+        return redshifts[np.argmax(redshift_distribution)]
+
+    def _evaluate_redshifts(self, data, redshifts, batch_size=None):
+        """Evaluate the negative log-likelihood of light curves at a set of redshifts
+
+        The light curve data is only extracted once. For each candidate redshift, we
+        only update the redshift input channel of the encoder and the redshift that is
+        used for the decoder. The decoder always uses the candidate redshift, including
+        for models that predict the redshift. Running these models through
+        `~ParsnipModel.forward` would decode every candidate at the same predicted
+        redshift and give a flat distribution.
+
+        Parameters
+        ----------
+        data : dict
+            Data dictionary returned by `~ParsnipModel._get_data`
+        redshifts : `~numpy.ndarray`
+            Redshifts to evaluate each light curve at with shape (light curve,
+            redshift)
+        batch_size : int, optional
+            Number of (light curve, redshift) combinations to evaluate at once. By
+            default, four times settings['batch_size'].
+
+        Returns
+        -------
+        `~numpy.ndarray`
+            Negative log-likelihood for each light curve and redshift
+        """
+        if batch_size is None:
+            batch_size = 4 * self.settings['batch_size']
+
+        num_lcs, num_redshifts = redshifts.shape
+        chunk_size = max(1, batch_size // num_lcs)
+
+        nll = np.zeros((num_lcs, num_redshifts))
+
+        for start in range(0, num_redshifts, chunk_size):
+            chunk_redshifts = redshifts[:, start:start + chunk_size]
+            chunk_count = chunk_redshifts.shape[1]
+            flat_redshifts = (
+                torch.FloatTensor(chunk_redshifts.flatten()).to(self.device)
+            )
+
+            chunk_data = self._repeat_data(data, chunk_count)
+
+            # Update the redshift input channel for the encoder.
+            input_data = chunk_data['input_data']
+            if (self.settings['input_redshift']
+                    and not self.settings['predict_redshift']):
+                input_data[:, 0] = flat_redshifts[:, None]
+
+            encoding_mu, encoding_logvar = self.encode(input_data)
+            _, ref_times, color, encoding = self._sample(
+                encoding_mu, encoding_logvar, sample=False
+            )
+
+            time = chunk_data['compare_data'][:, 0]
+            obs_flux = chunk_data['compare_data'][:, 1]
+            obs_weight = chunk_data['compare_data'][:, 3]
+
+            _, model_flux = self.decode(encoding, ref_times, color, time,
+                                        flat_redshifts, chunk_data['band_indices'],
+                                        return_spectra=False)
+
+            # Use the MAP amplitude.
+            amplitude, _ = self._compute_amplitude(obs_weight, model_flux, obs_flux)
+            model_flux = model_flux * amplitude[:, None]
+
+            chunk_nll = torch.sum(0.5 * obs_weight * (obs_flux - model_flux)**2, axis=1)
+            nll[:, start:start + chunk_count] = (
+                chunk_nll.cpu().numpy().reshape((num_lcs, chunk_count))
+            )
+
+        return nll
+
+    def predict_redshift_distributions(self, light_curves, min_redshift=0.,
+                                       max_redshift=None, sampling=0.01,
+                                       coarse_sampling=None, refine_peaks=3,
+                                       batch_size=None):
+        """Predict the redshift distributions for a set of light curves.
+
+        This is a batched version of `~ParsnipModel.predict_redshift_distribution`. See
+        that method for details of the approximations that are made. For models that
+        predict the redshift, the light curves are decoded at each redshift in the grid
+        rather than at the redshift predicted by the encoder.
+
+        The redshift distributions can optionally be evaluated with a coarse-to-fine
+        approach. If coarse_sampling is set, we first evaluate each distribution on a
+        coarse grid with that sampling. We then evaluate the distribution on the fine
+        grid only in the regions around the most likely peaks of the coarse
+        distribution. Elsewhere, the fine distribution is interpolated from the coarse
+        one.
+
+        Parameters
+        ----------
+        light_curves : List[`~astropy.table.Table`] or `~lcdata.Dataset`
+            Light curves
+        min_redshift : float, optional
+            Minimum redshift to consider, by default 0.
+        max_redshift : float, optional
+            Maximum redshift to consider, by default specified by
+            settings['max_redshift'].
+        sampling : float, optional
+            Sampling to use, by default 0.01.
+        coarse_sampling : float, optional
+            Sampling of the coarse grid to use for the coarse-to-fine evaluation. By
+            default None, which evaluates the full fine grid.
+        refine_peaks : int, optional
+            Number of peaks of the coarse distribution to refine, by default 3.
+        batch_size : int, optional
+            Number of (light curve, redshift) combinations to evaluate at once. By
+            default, four times settings['batch_size'].
+
+        Returns
+        -------
+        `~numpy.ndarray`
+            Redshifts that the probability distributions were evaluated at
+        `~numpy.ndarray`
+            Redshift probability distribution for each light curve with shape (light
+            curve, redshift)
+        """
         if max_redshift is None:
             max_redshift = self.settings['max_redshift']
         sample_redshifts = np.arange(min_redshift, max_redshift + sampling / 100.,
@@ -1769,49 +4076,114 @@ class ParsnipModel(nn.Module):
             # gracefully.
             sample_redshifts[0] = 0.0001
 
-        light_curve = preprocess_light_curve(light_curve, self.settings,
-                                             ignore_missing_redshift=True)
+        if isinstance(light_curves, lcdata.Dataset):
+            light_curves = light_curves.light_curves
+        light_curves = [preprocess_light_curve(lc, self.settings,
+                                               ignore_missing_redshift=True)
+                        for lc in light_curves]
 
-        lcs = []
-        for redshift in sample_redshifts:
-            redshift_lc = light_curve.copy()
-            redshift_lc.meta['redshift'] = redshift
-            lcs.append(redshift_lc)
+        num_redshifts = len(sample_redshifts)
+        all_indices = np.arange(num_redshifts)
 
-        result = self.forward(lcs, sample=False)
-        nll = self.loss_function(result, return_individual=True,
-                                 return_components=True)[0]
-        nll = nll.detach().cpu().numpy()
+        if coarse_sampling is None:
+            step = 1
+            coarse_indices = all_indices
+        else:
+            step = max(1, int(np.round(coarse_sampling / sampling)))
+            coarse_indices = all_indices[::step]
+            if coarse_indices[-1] != num_redshifts - 1:
+                coarse_indices = np.append(coarse_indices, num_redshifts - 1)
+
+        nll = np.zeros((len(light_curves), num_redshifts))
+
+        with torch.no_grad():
+            for start in range(0, len(light_curves), self.settings['batch_size']):
+                batch_lcs = light_curves[start:start + self.settings['batch_size']]
+                data = self._get_data(batch_lcs)
+
+                coarse_redshifts = np.tile(sample_redshifts[coarse_indices],
+                                           (len(batch_lcs), 1))
+                coarse_nll = self._evaluate_redshifts(data, coarse_redshifts,
+                                                      batch_size=batch_size)
+
+                if step == 1:
+                    nll[start:start + len(batch_lcs)] = coarse_nll
+                    continue
+
+                # Find the fine grid points around the most likely coarse peaks that
+                # still need to be evaluated.
+                refine_indices = []
+                for lc_nll in coarse_nll:
+                    pad_nll = np.pad(lc_nll, 1, constant_values=np.inf)
+                    peaks = np.where((lc_nll <= pad_nll[:-2])
+                                     & (lc_nll <= pad_nll[2:]))[0]
+                    peaks = peaks[np.argsort(lc_nll[peaks])][:refine_peaks]
+
+                    lc_indices = set()
+                    for peak in coarse_indices[peaks]:
+                        lc_indices.update(range(max(0, peak - step + 1),
+                                                min(num_redshifts, peak + step)))
+                    lc_indices = np.array(sorted(lc_indices - set(coarse_indices)),
+                                          dtype=int)
+                    refine_indices.append(lc_indices)
+
+                # Pad the refinement points so that every light curve has the same
+                # number of them. Repeated evaluations are harmless.
+                max_refine = max([len(i) for i in refine_indices])
+                if max_refine > 0:
+                    refine_indices = np.array([
+                        np.pad(i, (0, max_refine - len(i)), mode='edge') if len(i)
+                        else np.full(max_refine, coarse_indices[0])
+                        for i in refine_indices
+                    ])
+                    refine_nll = self._evaluate_redshifts(
+                        data, sample_redshifts[refine_indices], batch_size=batch_size
+                    )
 
-        # Normalize the probability distribution
-        prob = np.exp(-(nll - np.min(nll)))
-        prob = prob / np.sum(prob) / sampling
+                for idx in range(len(batch_lcs)):
+                    # Interpolate the coarse grid, then fill in the refined points.
+                    lc_nll = np.interp(all_indices, coarse_indices, coarse_nll[idx])
+                    if max_refine > 0:
+                        lc_nll[refine_indices[idx]] = refine_nll[idx]
+                        # Restore the coarse values that were used for padding.
+                        lc_nll[coarse_indices] = coarse_nll[idx]
+                    nll[start + idx] = lc_nll
+
+        # Normalize the probability distributions
+        prob = np.exp(-(nll - np.min(nll, axis=1)[:, None]))
+        prob = prob / np.sum(prob, axis=1)[:, None] / sampling
 
         return sample_redshifts, prob
 
-    def predict_redshift(self, light_curve, min_redshift=0., max_redshift=None,
-                         sampling=0.01):
-        """Predict the redshift of a light curve.
+    def predict_redshifts(self, light_curves, min_redshift=0., max_redshift=None,
+                          sampling=0.01, coarse_sampling=None, refine_peaks=3,
+                          batch_size=None):
+        """Predict the redshifts of a set of light curves.
 
-        This evaluates the MAP estimate of the redshift.
+        This is a batched version of `~ParsnipModel.predict_redshift` that evaluates
+        the MAP estimate of the redshift of each light curve. See
+        `~ParsnipModel.predict_redshift_distributions` for details of the parameters.
 
         Parameters
         ----------
-        light_curve : `~astropy.table.Table`
-            Light curve
+        light_curves : List[`~astropy.table.Table`] or `~lcdata.Dataset`
+            Light curves
 
         Returns
         -------
-        float
-            MAP estimate of the redshift
+        `~numpy.ndarray`
+            MAP estimate of the redshift of each light curve
         """
-        redshifts, redshift_distribution = self.predict_redshift_distribution(
-            light_curve,
+        redshifts, redshift_distributions = self.predict_redshift_distributions(
+            light_curves,
             min_redshift=min_redshift,
             max_redshift=max_redshift,
-            sampling=sampling
+            sampling=sampling,
+            coarse_sampling=coarse_sampling,
+            refine_peaks=refine_peaks,
+            batch_size=batch_size,
         )
-        return redshifts[np.argmax(redshift_distribution)]
+        return redshifts[np.argmax(redshift_distributions, axis=1)]
 
 
 def load_model(path=None, device='cpu', threads=8):
@@ -0,0 +1,385 @@
+import h5py
+import io
+import multiprocessing
+import numpy as np
+import queue
+import threading
+import time
+
+import astropy.table
+
+# Marker that is sent through the queues when a stage has finished.
+_STOP = object()
+
+
+class _StageFailure():
+    """Wrapper for an exception raised in a stage of a pipeline"""
+    def __init__(self, exception):
+        self.exception = exception
+
+
+class PredictionPipeline():
+    """Generate predictions for a dataset in chunks with overlapping reading,
+    preprocessing and inference
+
+    Reading a chunk, preprocessing it and running it through the model are done in
+    separate stages that run at the same time:
+
+    - read: Load each chunk in a background thread.
+    - preprocess: Preprocess each chunk in a background thread using a pool of worker
+      processes that persists across chunks.
+    - inference: Generate the predictions for each chunk in the calling thread.
+
+    The stages are connected by bounded queues, so at most `queue_size` chunks are
+    waiting between any two stages. The time that each stage spends working is
+    recorded so that bottlenecks can be identified with
+    `PredictionPipeline.utilization`.
+
+    Parameters
+    ----------
+    model : `~ParsnipModel`
+        Model to generate predictions with
+    augments : int, optional
+        Number of times to augment each light curve, by default 0. If this is nonzero,
+        predictions are generated with `~ParsnipModel.predict_dataset_augmented`.
+    queue_size : int, optional
+        Maximum number of chunks waiting between two stages, by default 2
+    processes : int, optional
+        Number of worker processes to use for preprocessing, by default
+        `ParsnipModel.threads`.
+    """
+    def __init__(self, model, augments=0, queue_size=2, processes=None):
+        self.model = model
+        self.augments = augments
+        self.queue_size = queue_size
+        if processes is None:
+            processes = model.threads
+        self.processes = processes
+
+        self.busy_time = {'read': 0., 'preprocess': 0., 'inference': 0.}
+        self.elapsed_time = 0.
+
+    @property
+    def utilization(self):
+        """Fraction of the time that each stage of the pipeline spent working
+
+        Returns
+        -------
+        dict[str, float]
+            Utilization of the read, preprocess and inference stages for the last call
+            to `PredictionPipeline.predict`.
+        """
+        if self.elapsed_time == 0:
+            return {stage: 0. for stage in self.busy_time}
+
+        return {stage: busy_time / self.elapsed_time for stage, busy_time in
+                self.busy_time.items()}
+
+    def predict(self, load_chunk, chunk_indices):
+        """Generate predictions for a set of chunks
+
+        The chunks are processed in the given order. The pipeline is shut down if the
+        caller stops iterating early or if any stage raises an exception, in which case
+        the exception is raised here.
+
+        Parameters
+        ----------
+        load_chunk : Callable[[int], `~lcdata.Dataset`]
+            Function that loads the chunk with the given index
+        chunk_indices : Iterable[int]
+            Indices of the chunks to generate predictions for
+
+        Yields
+        ------
+        chunk_idx : int
+            Index of the chunk
+        predictions : `~astropy.table.Table`
+            Predictions for the chunk in the format of `~ParsnipModel.predict_dataset`
+        """
+        chunk_indices = list(chunk_indices)
+
+        self.busy_time = {'read': 0., 'preprocess': 0., 'inference': 0.}
+        self.elapsed_time = 0.
+
+        stop_event = threading.Event()
+        read_queue = queue.Queue(self.queue_size)
+        preprocess_queue = queue.Queue(self.queue_size)
+
+        def put(output_queue, item):
+            # Wait for space in the queue unless the pipeline is being shut down.
+            while not stop_event.is_set():
+                try:
+                    output_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def get(input_queue):
+            # Wait for an item in the queue unless the pipeline is being shut down.
+            while True:
+                try:
+                    return input_queue.get(timeout=0.1)
+                except queue.Empty:
+                    if stop_event.is_set():
+                        return _STOP
+
+        def run_stage(stage, output_queue):
+            # Run a stage, and tell the next stage when it is done or if it failed.
+            try:
+                stage()
+            except BaseException as e:
+                put(output_queue, _StageFailure(e))
+            else:
+                put(output_queue, _STOP)
+
+        def read():
+            for chunk_idx in chunk_indices:
+                start_time = time.perf_counter()
+                chunk = load_chunk(chunk_idx)
+                self.busy_time['read'] += time.perf_counter() - start_time
+
+                if not put(read_queue, (chunk_idx, chunk)):
+                    return
+
+        def preprocess():
+            while True:
+                item = get(read_queue)
+                if item is _STOP:
+                    return
+                elif isinstance(item, _StageFailure):
+                    raise item.exception
+
+                chunk_idx, chunk = item
+                start_time = time.perf_counter()
+                chunk = self.model.preprocess(chunk, verbose=False, pool=pool,
+                                              processes=self.processes)
+                self.busy_time['preprocess'] += time.perf_counter() - start_time
+
+                if not put(preprocess_queue, (chunk_idx, chunk)):
+                    return
+
+        # Start the pool before any threads so that the worker processes are forked
+        # from a single-threaded process.
+        if self.processes > 1:
+            pool = multiprocessing.Pool(self.processes)
+        else:
+            pool = None
+
+        threads = [
+            threading.Thread(target=run_stage, args=(read, read_queue), daemon=True),
+            threading.Thread(target=run_stage, args=(preprocess, preprocess_queue),
+                             daemon=True),
+        ]
+
+        start_time = time.perf_counter()
+
+        try:
+            for thread in threads:
+                thread.start()
+
+            while True:
+                item = get(preprocess_queue)
+                if item is _STOP:
+                    break
+                elif isinstance(item, _StageFailure):
+                    raise item.exception
+
+                chunk_idx, chunk = item
+                inference_start_time = time.perf_counter()
+                if self.augments == 0:
+                    predictions = self.model.predict_dataset(chunk)
+                else:
+                    predictions = self.model.predict_dataset_augmented(
+                        chunk, augments=self.augments
+                    )
+                self.busy_time['inference'] += (
+                    time.perf_counter() - inference_start_time
+                )
+
+                yield chunk_idx, predictions
+        finally:
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+            self.elapsed_time = time.perf_counter() - start_time
+
+
+def _serialize_table_hdf5(table, name):
+    """Serialize a table in the same way as `astropy.table.Table.write` for HDF5
+
+    Returns
+    -------
+    data : `~numpy.ndarray`
+        Structured array with the serialized columns
+    header : `~numpy.ndarray`
+        Encoded YAML header describing the columns
+    """
+    with h5py.File(io.BytesIO(), 'w') as buffer:
+        table.write(buffer, path=name, serialize_meta=True)
+        return buffer[name][()], buffer[name + '.__table_column_meta__'][()]
+
+
+def _convert_table_data(data, dtype):
+    """Convert serialized table data to a new structured dtype
+
+    String fields are widened as needed, and any fields that are missing from the data
+    (masks of masked columns) are filled with zeros.
+    """
+    new_data = np.zeros(len(data), dtype=dtype)
+    for name in data.dtype.names:
+        new_data[name] = data[name]
+    return new_data
+
+
+def _get_table_layout(table, name, string_lengths):
+    """Determine the layout of a table in an HDF5 file that rows can be appended to
+
+    astropy only stores the mask of a masked column if any of its values are masked,
+    and it stores strings with the length of the longest one, so the serialized chunks
+    of a table can have different dtypes. We serialize a row where every masked column
+    is masked and widen the string columns to the given lengths so that the rows of
+    all of the chunks fit in the table without rewriting it.
+
+    Parameters
+    ----------
+    table : `~astropy.table.Table`
+        Table with at least one row
+    name : str
+        Name of the table in the HDF5 file
+    string_lengths : dict[str, int]
+        Minimum length in bytes of each string column
+
+    Returns
+    -------
+    dtype : `~numpy.dtype`
+        Structured dtype of the table in the file
+    header : `~numpy.ndarray`
+        Encoded YAML header describing the columns
+    """
+    template = table[:1].copy()
+    for column in template.itercols():
+        if isinstance(column, astropy.table.MaskedColumn):
+            template[column.name] = astropy.table.MaskedColumn(column, mask=[True])
+    layout, header = _serialize_table_hdf5(template, name)
+
+    fields = []
+    for field_name in layout.dtype.names:
+        field = layout.dtype.fields[field_name][0]
+        if field.kind == 'S' and field_name in string_lengths:
+            field = np.dtype(f'S{max(field.itemsize, string_lengths[field_name])}')
+        fields.append((field_name, field))
+
+    return np.dtype(fields), header
+
+
+def _check_table_dtype(dtype, table_dtype):
+    """Check that serialized table data can be stored in a table in an HDF5 file
+
+    Raises
+    ------
+    ValueError
+        If the data has columns that aren't in the table, if any columns have
+        different types, or if any strings are longer than the ones in the table.
+    """
+    if not set(dtype.names) <= set(table_dtype.names):
+        raise ValueError(
+            f"Can't append a table with columns {dtype.names} to a table with "
+            f"columns {table_dtype.names}."
+        )
+
+    for name in dtype.names:
+        field = dtype.fields[name][0]
+        table_field = table_dtype.fields[name][0]
+        if field.kind == table_field.kind == 'S':
+            if field.itemsize > table_field.itemsize:
+                raise ValueError(
+                    f"Can't append strings of length {field.itemsize} to column "
+                    f"'{name}' with length {table_field.itemsize}. Use string_lengths "
+                    f"to reserve enough space when the table is created."
+                )
+        elif field != table_field:
+            raise ValueError(
+                f"Can't append column '{name}' with dtype {field} to a column with "
+                f"dtype {table_field}."
+            )
+
+
+def append_table_hdf5(table, path, name='predictions', num_rows=None,
+                      string_lengths=None):
+    """Append the rows of a table to a table in an HDF5 file
+
+    The table is stored in the same format as `astropy.table.Table.write` with
+    serialize_meta=True, so the result can be read with `astropy.table.Table.read`.
+    The table is created from the first table with any rows that is appended, and its
+    layout is fixed at that point. All of the tables that are appended must have the
+    same columns, and strings can be at most as long as the ones in the first table
+    unless longer lengths are reserved with `string_lengths`.
+
+    Parameters
+    ----------
+    table : `~astropy.table.Table`
+        Table to append
+    path : str
+        Path to the HDF5 file
+    name : str, optional
+        Name of the table in the HDF5 file, by default 'predictions'
+    num_rows : int, optional
+        Number of rows that the table in the file is expected to have. Any rows past
+        this are discarded before appending. This can be used to recover from a write
+        that was interrupted. By default, all of the rows are kept.
+    string_lengths : dict[str, int], optional
+        Length in bytes to reserve for each string column when the table is created.
+        Strings are stored with UTF-8 encoding.
+
+    Returns
+    -------
+    int
+        Number of rows in the table in the file after appending
+
+    Raises
+    ------
+    ValueError
+        If `num_rows` is nonzero and the table doesn't exist, or if the table can't
+        hold the rows.
+    """
+    header_name = name + '.__table_column_meta__'
+
+    if string_lengths is None:
+        string_lengths = {}
+
+    data, header = _serialize_table_hdf5(table, name)
+
+    with h5py.File(path, 'a') as output:
+        if name not in output:
+            if num_rows:
+                raise ValueError(
+                    f"Expected {num_rows} rows in table '{name}' in {path}, but the "
+                    f"table doesn't exist."
+                )
+            if len(data) == 0:
+                # We need a row to determine the layout of the table.
+                return 0
+            dtype, header = _get_table_layout(table, name, string_lengths)
+            dataset = output.create_dataset(name, shape=(0,), dtype=dtype,
+                                            maxshape=(None,), chunks=True)
+            output.create_dataset(header_name, data=header)
+        else:
+            dataset = output[name]
+            if num_rows is not None:
+                dataset.resize((num_rows,))
+
+        start = dataset.shape[0]
+        if len(data) == 0:
+            return start
+
+        _check_table_dtype(data.dtype, dataset.dtype)
+
+        dataset.resize((start + len(data),))
+        dataset[start:] = _convert_table_data(data, dataset.dtype)
+
+        return dataset.shape[0]
@@ -17,6 +17,17 @@ default_settings = {
     'spectrum_bins': 300,
     'max_redshift': 4.,
     'band_oversampling': 51,
+    # Interpolation used for the band weight tables, 'linear' or 'cubic'. With cubic
+    # interpolation, the tables can be stored at a much coarser resolution by only
+    # keeping every band_table_stride'th entry.
+    'band_interpolation': 'linear',
+    'band_table_stride': 1,
+    # Number of redshifts to keep the interpolated band weights for in an LRU cache,
+    # or 0 to disable the cache. Redshifts are rounded to the given tolerance when
+    # they are looked up in the cache. A tolerance of 0 requires an exact match. The
+    # cache is only used when gradients are disabled.
+    'band_weight_cache_size': 0,
+    'band_weight_cache_tolerance': 0.,
     'time_window': 300,
     'time_pad': 100,
     'time_sigma': 20.,
@@ -43,6 +54,20 @@ default_settings = {
     'encode_latent_postpool_architecture': [200],
     'decode_architecture': [40, 80, 160],
 
+    # Recompute the activations of the encoder during the backward pass instead of
+    # storing them. This reduces the memory required for training at the cost of
+    # additional computation.
+    'encode_checkpoint': False,
+
+    # Approximate memory budget in MB for decoding photometry without returning the
+    # model spectra. Light curves with many observations are decoded in chunks of
+    # observations that fit within this budget.
+    'decode_memory_budget': 1000,
+
+    # When decoding photometry without returning the model spectra, group the
+    # observations by band and only decode the spectrum bins that overlap each band.
+    'decode_sparse_photometry': False,
+
     # Settings that will be filled later.
     'derived_settings_calculated': None,
     'bands': None,
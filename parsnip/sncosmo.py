@@ -1,4 +1,4 @@
-from scipy.interpolate import interp1d
+from collections import OrderedDict
 import numpy as np
 import os
 import sncosmo
@@ -16,12 +16,27 @@ class ParsnipSncosmoSource(sncosmo.Source):
     ----------
     model : `~ParsnipModel` or str, optional
         ParSNIP model to use, or path to a model on disk.
+    cache_size : int, optional
+        Number of decoded spectral time series to keep in the cache, by default 1000.
+        Fitters and samplers evaluate the model many times with the same latent
+        variables and phases, so we cache the output of the decoder. Set this to 0 to
+        disable the cache.
+    interpolation_cache_size : int, optional
+        Number of wavelength interpolation matrices to keep in the cache, by default
+        32. sncosmo uses a different wavelength grid for each band and redshift.
     """
-    def __init__(self, model=None):
+    def __init__(self, model=None, cache_size=1000, interpolation_cache_size=32):
         if not isinstance(model, parsnip.ParsnipModel):
             model = parsnip.load_model(model)
 
         self._model = model
+        self._color_law = model.color_law.cpu().numpy()
+
+        # Caches for the decoded spectra and the wavelength interpolation matrices.
+        self.cache_size = cache_size
+        self.interpolation_cache_size = interpolation_cache_size
+        self._spectra_cache = OrderedDict()
+        self._interpolation_cache = OrderedDict()
 
         model_name = os.path.splitext(os.path.basename(model.path))[0]
         self.name = f'parsnip_{model_name}'
@@ -38,19 +53,77 @@ class ParsnipSncosmoSource(sncosmo.Source):
         self._parameters = np.zeros(len(self._param_names))
         self._parameters[0] = 1.
 
+    def _get_cached(self, cache, key, func, max_size):
+        """Look up a value in an LRU cache, computing it with func if it is missing"""
+        try:
+            value = cache.pop(key)
+        except KeyError:
+            value = func()
+            if max_size <= 0:
+                return value
+            if len(cache) >= max_size:
+                cache.popitem(last=False)
+        cache[key] = value
+        return value
+
+    def _decode_intrinsic_spectra(self, encoding, phase):
+        """Decode the intrinsic spectra with shape (phase, model wavelength)"""
+        encoding = torch.as_tensor(encoding, dtype=torch.float32)[None, :]
+        phase = torch.as_tensor(phase * SIDEREAL_SCALE, dtype=torch.float32)[None, :]
+
+        with torch.no_grad():
+            model_spectra = self._model.decode_spectra(
+                encoding.to(self._model.device), phase.to(self._model.device), None
+            )
+
+        return model_spectra[0].T.cpu().numpy()
+
+    def _build_interpolation_matrix(self, wave):
+        """Build a matrix that linearly interpolates spectra from the model wavelengths
+        to the given wavelengths"""
+        model_wave = self._model.model_wave
+
+        if np.any(wave < model_wave[0]) or np.any(wave > model_wave[-1]):
+            raise ValueError(f"Wavelengths must be between {model_wave[0]} and "
+                             f"{model_wave[-1]}.")
+
+        indices = np.clip(np.searchsorted(model_wave, wave, side='right') - 1, 0,
+                          len(model_wave) - 2)
+        frac = (wave - model_wave[indices]) / (model_wave[indices + 1]
+                                               - model_wave[indices])
+
+        matrix = np.zeros((len(model_wave), len(wave)))
+        wave_indices = np.arange(len(wave))
+        matrix[indices, wave_indices] = 1 - frac
+        matrix[indices + 1, wave_indices] += frac
+
+        return matrix
+
     def _flux(self, phase, wave):
-        # Generate predictions at the given phase.
-        encoding = (torch.FloatTensor(self._parameters[2:])[None, :]
-                    .to(self._model.device))
-        phase = phase * SIDEREAL_SCALE
-        phase = torch.FloatTensor(phase)[None, :].to(self._model.device)
-        color = torch.FloatTensor([self._parameters[1]]).to(self._model.device)
-        amplitude = (torch.FloatTensor([self._parameters[0]]).to(self._model.device))
-
-        model_spectra = self._model.decode_spectra(encoding, phase, color, amplitude)
-        model_spectra = model_spectra.detach().cpu().numpy()[0]
-
-        flux = interp1d(self._model.model_wave, model_spectra.T)(wave)
+        phase = np.asarray(phase, dtype=float)
+        wave = np.asarray(wave, dtype=float)
+        amplitude, color = self._parameters[:2]
+        encoding = self._parameters[2:]
+
+        # The decoder output only depends on the latent variables and the phases, so
+        # that is all that we need to cache. The amplitude and color are applied
+        # afterwards.
+        spectra_key = (encoding.tobytes(), phase.shape, phase.tobytes())
+        intrinsic_spectra = self._get_cached(
+            self._spectra_cache, spectra_key,
+            lambda: self._decode_intrinsic_spectra(encoding, phase),
+            self.cache_size
+        )
+
+        # The interpolation matrix only depends on the wavelengths.
+        interpolation_matrix = self._get_cached(
+            self._interpolation_cache, (wave.shape, wave.tobytes()),
+            lambda: self._build_interpolation_matrix(wave),
+            self.interpolation_cache_size
+        )
+
+        scale = amplitude * 10**(-0.4 * color * self._color_law)
+        flux = (intrinsic_spectra * scale).dot(interpolation_matrix)
 
         return flux
 
@@ -0,0 +1,303 @@
+from tqdm import tqdm
+import json
+import lcdata
+import multiprocessing
+import numpy as np
+import os
+import sys
+import time
+import traceback
+
+import astropy.table
+import torch
+
+from .instruments import get_bands, split_train_test
+from .parsnip import ParsnipModel
+from .settings import parse_settings
+
+# Settings that affect how the light curves are preprocessed. All of the models in a
+# sweep must agree on these so that the data only needs to be preprocessed once.
+_PREPROCESSING_SETTINGS = ['bands', 'predict_redshift', 'time_window', 'time_pad']
+
+# Data for the worker processes. Each worker rebuilds the datasets from the
+# observations in shared memory when it starts.
+_sweep_data = {}
+
+
+def _share_light_curves(dataset):
+    """Move the observations of a dataset into shared memory
+
+    The observations of all of the light curves are concatenated into a single
+    structured array whose bytes are stored in a shared `torch.Tensor`. Shared tensors
+    are sent to other processes as handles to the shared memory rather than being
+    copied, with both the 'fork' and 'spawn' start methods.
+
+    Parameters
+    ----------
+    dataset : `~lcdata.Dataset`
+        Preprocessed dataset
+
+    Returns
+    -------
+    tuple
+        Shared observations, their structured dtype, the offset of the first
+        observation of each light curve, and the metadata of each light curve. This can
+        be turned back into a dataset with `_unshare_light_curves`.
+    """
+    if dataset is None:
+        return None
+
+    light_curves = dataset.light_curves
+    observations = np.concatenate([lc.as_array() for lc in light_curves])
+    offsets = np.cumsum([0] + [len(lc) for lc in light_curves])
+    shared_observations = torch.from_numpy(observations.view(np.uint8)).share_memory_()
+    metas = [dict(lc.meta) for lc in light_curves]
+
+    return shared_observations, observations.dtype, offsets, metas
+
+
+def _unshare_light_curves(shared_data):
+    """Rebuild a dataset from the output of `_share_light_curves`
+
+    The columns of the light curves are views into the shared memory.
+    """
+    if shared_data is None:
+        return None
+
+    shared_observations, dtype, offsets, metas = shared_data
+    observations = shared_observations.numpy().view(dtype)
+
+    light_curves = [
+        astropy.table.Table(observations[start:end], meta=meta, copy=False)
+        for start, end, meta in zip(offsets[:-1], offsets[1:], metas)
+    ]
+
+    return lcdata.from_light_curves(light_curves)
+
+
+def _init_sweep_worker(shared_train_data, shared_test_data, threads):
+    """Initialize a worker process for a sweep"""
+    _sweep_data['train_dataset'] = _unshare_light_curves(shared_train_data)
+    _sweep_data['test_dataset'] = _unshare_light_curves(shared_test_data)
+    _sweep_data['threads'] = threads
+
+
+def _train_sweep_configuration(job):
+    """Train and score a single configuration of a sweep in a worker process
+
+    Parameters
+    ----------
+    job : dict
+        Description of the configuration to train.
+
+    Returns
+    -------
+    dict
+        Results for the configuration
+    """
+    train_dataset = _sweep_data['train_dataset']
+    test_dataset = _sweep_data['test_dataset']
+
+    start_time = time.time()
+
+    result = {
+        'name': job['name'],
+        'model_path': job['model_path'],
+        'settings': json.dumps(job['settings'], sort_keys=True),
+        'epochs': -1,
+        'elapsed_time': np.nan,
+        'train_score': np.nan,
+        'test_score': np.nan,
+        'error': '',
+    }
+
+    try:
+        model = ParsnipModel(
+            job['model_path'],
+            job['bands'],
+            device=job['device'],
+            threads=_sweep_data['threads'],
+            settings=job['settings'],
+        )
+
+        # Redirect the progress bars so that the outputs of the different workers
+        # aren't interleaved.
+        log_path = job['model_path'] + '.log'
+        with open(log_path, 'w') as log_file:
+            stdout = sys.stdout
+            sys.stdout = log_file
+            try:
+                model.fit(train_dataset, test_dataset=test_dataset,
+                          max_epochs=job['max_epochs'])
+            finally:
+                sys.stdout = stdout
+
+        # If we have a small dataset, repeat the dataset several times when calculating
+        # the score. This matches the scores reported by parsnip_train.
+        rounds = int(np.ceil(25000 / len(train_dataset)))
+        result['train_score'] = model.score(train_dataset, rounds=rounds)
+        if test_dataset is not None:
+            result['test_score'] = model.score(test_dataset, rounds=10 * rounds)
+        result['epochs'] = model.epoch
+    except Exception:
+        result['error'] = traceback.format_exc()
+
+    # Time taken in minutes
+    result['elapsed_time'] = (time.time() - start_time) / 60.
+
+    return result
+
+
+def run_sweep(dataset, configurations, model_directory, bands=None, max_epochs=1000,
+              split_train_test_data=True, processes=None, threads_per_worker=None,
+              device='cpu', verbose=True):
+    """Train and score a set of ParSNIP model configurations in parallel
+
+    The dataset is preprocessed a single time and then shared between all of the
+    models. The models are trained concurrently in a pool of worker processes. Each
+    worker uses a fixed number of threads so that the workers don't compete with each
+    other for the CPU.
+
+    The observations of the preprocessed light curves are stored in shared memory,
+    and each worker builds its light curves as views into that memory. Only the
+    metadata of the light curves is copied into each worker.
+
+    Parameters
+    ----------
+    dataset : `~lcdata.Dataset`
+        Dataset to train on
+    configurations : dict[str, dict]
+        Configurations to train. The keys are names for each configuration, and the
+        values are dictionaries of settings that override the defaults in settings.py.
+        The settings that affect preprocessing ('bands', 'predict_redshift',
+        'time_window' and 'time_pad') must be the same for every configuration.
+    model_directory : str
+        Directory to save the models to. Each model will be saved to
+        `{model_directory}/{name}.pt`, and its training log to
+        `{model_directory}/{name}.pt.log`.
+    bands : List[str], optional
+        Bands to use for the models. By default, all of the bands in the dataset are
+        used.
+    max_epochs : int, optional
+        Maximum number of epochs to train each model for, by default 1000
+    split_train_test_data : bool, optional
+        Whether to hold out part of the dataset to calculate a test score with, by
+        default True
+    processes : int, optional
+        Number of models to train at the same time, by default the smaller of the
+        number of configurations and the number of CPUs.
+    threads_per_worker : int, optional
+        Number of threads that each worker uses, by default the number of CPUs divided
+        by the number of processes.
+    device : str, optional
+        PyTorch device to train the models on, by default 'cpu'. Note that CUDA cannot
+        be used in forked workers if it has already been initialized in the main
+        process.
+    verbose : bool, optional
+        Whether to show progress bars, by default True
+
+    Returns
+    -------
+    `~astropy.table.Table`
+        Table with one row per configuration containing the configuration name, the
+        path to the model, the settings for the configuration (as JSON), the number of
+        epochs trained, the time taken in minutes, the train and test scores, and any
+        errors that occurred while training.
+
+    Raises
+    ------
+    ValueError
+        If no configurations are given, or if the configurations have different
+        preprocessing settings.
+    """
+    if len(configurations) == 0:
+        raise ValueError("At least one configuration is required for a sweep.")
+
+    if bands is None:
+        bands = get_bands(dataset)
+
+    # Make sure that all of the configurations share the same preprocessing.
+    preprocessing_settings = None
+    for name, settings in configurations.items():
+        model_settings = parse_settings(bands, settings)
+        config_preprocessing_settings = {
+            key: model_settings[key] for key in _PREPROCESSING_SETTINGS
+        }
+        if preprocessing_settings is None:
+            preprocessing_settings = config_preprocessing_settings
+            preprocessing_model_settings = settings
+        elif config_preprocessing_settings != preprocessing_settings:
+            raise ValueError(
+                f"Configuration '{name}' has different preprocessing settings than the "
+                f"other configurations. The settings {_PREPROCESSING_SETTINGS} must be "
+                "the same for all configurations."
+            )
+
+    cpu_count = os.cpu_count() or 1
+    if processes is None:
+        processes = min(len(configurations), cpu_count)
+    if threads_per_worker is None:
+        threads_per_worker = max(1, cpu_count // processes)
+
+    # Preprocess the data once for all of the models.
+    preprocess_model = ParsnipModel(
+        os.path.join(model_directory, 'preprocess.pt'), bands, threads=cpu_count,
+        settings=preprocessing_model_settings
+    )
+    dataset = preprocess_model.preprocess(dataset, verbose=verbose)
+
+    if split_train_test_data:
+        train_dataset, test_dataset = split_train_test(dataset)
+    else:
+        train_dataset = dataset
+        test_dataset = None
+
+    # Move the observations into shared memory so that the workers don't need their
+    # own copies of them.
+    shared_train_data = _share_light_curves(train_dataset)
+    shared_test_data = _share_light_curves(test_dataset)
+    del dataset, train_dataset, test_dataset
+
+    os.makedirs(model_directory, exist_ok=True)
+
+    jobs = []
+    for name, settings in configurations.items():
+        jobs.append({
+            'name': name,
+            'model_path': os.path.join(model_directory, f'{name}.pt'),
+            'bands': bands,
+            'settings': settings,
+            'max_epochs': max_epochs,
+            'device': device,
+        })
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+
+    # The main process doesn't need any threads while the workers are running.
+    main_threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+
+    try:
+        with context.Pool(processes, initializer=_init_sweep_worker,
+                          initargs=(shared_train_data, shared_test_data,
+                                    threads_per_worker)) as pool:
+            iterator = pool.imap_unordered(_train_sweep_configuration, jobs)
+            if verbose:
+                iterator = tqdm(iterator, total=len(jobs), file=sys.stdout,
+                                desc='Training models')
+            results = {result['name']: result for result in iterator}
+    finally:
+        torch.set_num_threads(main_threads)
+
+    # Return the results in the same order as the configurations.
+    results = astropy.table.Table(rows=[results[job['name']] for job in jobs])
+
+    if verbose:
+        for row in results:
+            if row['error']:
+                print(f"Configuration '{row['name']}' failed:\n{row['error']}")
+
+    return results
@@ -0,0 +1,217 @@
+from contextlib import contextmanager
+import json
+import os
+import sys
+import time
+
+import torch
+
+try:
+    import resource
+except ImportError:
+    # The resource module is not available on Windows.
+    resource = None
+
+
+class FitTelemetry():
+    """Record timing, throughput and memory statistics while fitting a model
+
+    An instance of this class can be passed to `ParsnipModel.fit` to record how long
+    each phase of a training step takes. At the end of every epoch, a record is
+    produced with the following keys:
+
+    - epoch : The epoch number
+    - steps : Number of training steps in the epoch
+    - light_curves : Number of light curves processed in the epoch
+    - elapsed_time : Wall time for the training steps in the epoch in seconds
+    - light_curves_per_second : Training throughput
+    - phase_times : Dictionary with the total wall time spent in each phase of the
+      training steps in seconds. Phases can be nested, e.g. 'band_weights' is part of
+      'decode' which is part of 'forward'.
+    - nan_gradients : Number of NaN gradients that were replaced with zeros
+    - peak_memory : Peak memory allocated on the GPU during the epoch in bytes, or
+      None if the model is not on a GPU.
+    - peak_rss : Peak resident set size of the process in bytes since it was started,
+      or None if it is not available. Unlike peak_memory, this is not reset at the
+      start of each epoch, so it only increases if an epoch uses more memory than
+      everything that ran before it.
+
+    along with any additional values passed by `ParsnipModel.fit` (e.g. the train and
+    test losses and the learning rate).
+
+    `ParsnipModel.fit` calls `FitTelemetry.start_epoch`, `FitTelemetry.start_step`,
+    `FitTelemetry.end_step` and `FitTelemetry.end_epoch` as it trains. These can also
+    be called directly to record statistics for a custom training loop.
+
+    Parameters
+    ----------
+    output : str or Callable[[dict], Any], optional
+        Where to send the records. If this is a string, the records will be appended
+        to a file at that path with one JSON record per line. If this is a function, it
+        will be called with each record. By default None, in which case the records are
+        only stored in `FitTelemetry.records`.
+    profile_steps : List[int], optional
+        Training steps to profile with `torch.profiler`. The steps are counted from the
+        start of the fit. A Chrome trace will be written for each step. By default None
+        which disables profiling.
+    profile_path : str, optional
+        Directory to write the profiler traces to, by default './parsnip_traces'
+    """
+    def __init__(self, output=None, profile_steps=None,
+                 profile_path='./parsnip_traces'):
+        self.output = output
+        self.profile_steps = set() if profile_steps is None else set(profile_steps)
+        self.profile_path = profile_path
+
+        self.records = []
+        self.step = 0
+
+        self._device = None
+        self._profiler = None
+        self.start_epoch(None, 'cpu')
+
+    def _synchronize(self):
+        """Wait for all work on the device to finish so that the timings are
+        accurate"""
+        if self._device is not None and self._device.startswith('cuda'):
+            torch.cuda.synchronize(self._device)
+
+    def start_epoch(self, epoch, device):
+        """Reset the statistics at the start of an epoch
+
+        Parameters
+        ----------
+        epoch : int
+            Epoch number
+        device : str
+            PyTorch device that the model is on
+        """
+        self._device = device
+        self._epoch = epoch
+        self._steps = 0
+        self._light_curves = 0
+        self._nan_gradients = 0
+        self._phase_times = {}
+        self._step_time = 0.
+
+        if device.startswith('cuda'):
+            torch.cuda.reset_peak_memory_stats(device)
+
+    @contextmanager
+    def phase(self, name):
+        """Context manager that records the time spent in a phase of a training step
+
+        Parameters
+        ----------
+        name : str
+            Name of the phase
+        """
+        self._synchronize()
+        start_time = time.perf_counter()
+
+        # Record the time spent in the phase even if it raises an exception.
+        try:
+            if self._profiler is not None:
+                with torch.profiler.record_function(name):
+                    yield
+            else:
+                yield
+        finally:
+            self._synchronize()
+            self._phase_times[name] = (
+                self._phase_times.get(name, 0.) + time.perf_counter() - start_time
+            )
+
+    def start_step(self):
+        """Start timing a training step"""
+        if self.step in self.profile_steps:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if self._device.startswith('cuda'):
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self._profiler = torch.profiler.profile(activities=activities,
+                                                    record_shapes=True)
+            self._profiler.__enter__()
+
+        self._synchronize()
+        self._step_start_time = time.perf_counter()
+
+    def end_step(self, light_curve_count, nan_gradient_count):
+        """Finish timing a training step
+
+        Parameters
+        ----------
+        light_curve_count : int
+            Number of light curves processed in the step
+        nan_gradient_count : int
+            Number of NaN gradients that were replaced in the step
+        """
+        self._synchronize()
+        self._step_time += time.perf_counter() - self._step_start_time
+
+        self._steps += 1
+        self._light_curves += light_curve_count
+        self._nan_gradients += nan_gradient_count
+
+        if self._profiler is not None:
+            self._profiler.__exit__(None, None, None)
+            os.makedirs(self.profile_path, exist_ok=True)
+            self._profiler.export_chrome_trace(
+                os.path.join(self.profile_path, f'step_{self.step}.json')
+            )
+            self._profiler = None
+
+        self.step += 1
+
+    def end_epoch(self, **kwargs):
+        """Build the record for an epoch and send it to the output
+
+        Parameters
+        ----------
+        **kwargs
+            Additional values to include in the record
+
+        Returns
+        -------
+        dict
+            Record for the epoch
+        """
+        if self._device.startswith('cuda'):
+            peak_memory = torch.cuda.max_memory_allocated(self._device)
+        else:
+            peak_memory = None
+
+        if resource is not None:
+            # ru_maxrss is in bytes on macOS and in kilobytes everywhere else.
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            if sys.platform != 'darwin':
+                peak_rss *= 1024
+        else:
+            peak_rss = None
+
+        if self._step_time > 0:
+            light_curves_per_second = self._light_curves / self._step_time
+        else:
+            light_curves_per_second = None
+
+        record = {
+            'epoch': self._epoch,
+            'steps': self._steps,
+            'light_curves': self._light_curves,
+            'elapsed_time': self._step_time,
+            'light_curves_per_second': light_curves_per_second,
+            'phase_times': dict(self._phase_times),
+            'nan_gradients': self._nan_gradients,
+            'peak_memory': peak_memory,
+            'peak_rss': peak_rss,
+            **kwargs,
+        }
+
+        self.records.append(record)
+
+        if isinstance(self.output, str):
+            with open(self.output, 'a') as f:
+                print(json.dumps(record), file=f)
+        elif self.output is not None:
+            self.output(record)
+
+        return record
@@ -88,9 +88,19 @@ def replace_nan_grads(parameters, value=0.0):
         Model parameters, usually you can get them by `model.parameters()`
     value : float, optional
         Value to replace NaNs with
+
+    Returns
+    -------
+    int
+        Number of NaN gradients that were replaced
     """
+    count = 0
     for p in parameters:
         if p.grad is None:
             continue
         grads = p.grad.data
-        grads[torch.isnan(grads)] = value
+        mask = torch.isnan(grads)
+        grads[mask] = value
+        count += mask.sum()
+
+    return int(count)